@@ -1,8 +1,209 @@
 #!/usr/bin/env python3
 
 import re
-import argparse
 import os
+import sys
+import time
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+# Modules outside the common assembly path (argparse, glob, io, json, mmap,
+# tracemalloc) are imported where used, keeping startup short
+
+# Part of build cache keys, bump when output of same asm changes
+__version__ = '1.0'
+
+# C-command parsing dictionaries:
+_COMP_TABLE = {
+    '0': 0b1110101010, '1': 0b1110111111, '-1': 0b1110111010,
+    'D': 0b1110001100, 'A': 0b1110110000, '!D': 0b1110001101,
+    '!A': 0b1110110001, '-D': 0b1110001111, '-A': 0b1110110011,
+    'D+1': 0b1110011111, 'A+1': 0b1110110111, 'D-1': 0b1110001110,
+    'A-1': 0b1110110010, 'D+A': 0b1110000010, 'D-A': 0b1110010011,
+    'A-D': 0b1110000111, 'D&A': 0b1110000000, 'D|A': 0b1110010101,
+    'M': 0b1111110000, '!M': 0b1111110001, '-M': 0b1111110011,
+    'M+1': 0b1111110111, 'M-1': 0b1111110010, 'D+M': 0b1111000010,
+    'D-M': 0b1111010011, 'M-D': 0b1111000111, 'D&M': 0b1111000000,
+    'D|M': 0b1111010101
+}
+
+_DEST_TABLE = {
+    'None': 0b000, 'M': 0b001, 'D': 0b010, 'MD': 0b011,
+    'A': 0b100, 'AM': 0b101, 'AD': 0b110, 'AMD': 0b111
+}
+
+_JMP_TABLE = {
+    'None': 0b000, 'JGT': 0b001, 'JEQ': 0b010, 'JGE': 0b011,
+    'JLT': 0b100, 'JNE': 0b101, 'JLE': 0b110, 'JMP': 0b111
+}
+
+# Characters of symbols, which can not start with a digit
+_DIGITS = '0123456789'
+_SYMBOL_START = ('abcdefghijklmnopqrstuvwxyz'
+                 'ABCDEFGHIJKLMNOPQRSTUVWXYZ_.$:')
+_SYMBOL_CHARS = _SYMBOL_START + _DIGITS
+
+# Deletes symbol characters, leaving only illegal ones
+_NONSYMBOL = str.maketrans('', '', _SYMBOL_CHARS)
+
+# Largest constant of an A-instruction, the leading bit marks C-instructions
+_ADDRESS_MAX = 2**15 - 1
+
+# Predefined symbols, copied to the symbol table of every file
+_PREDEFINED = MappingProxyType(dict(
+    {'R' + str(i): i for i in range(16)},
+    SP=0, LCL=1, ARG=2, THIS=3, THAT=4, SCREEN=16384, KBD=24576))
+
+# Comments and whitespace, of a single line or keeping line ends of a buffer
+_RE_SANITIZE_LINE = re.compile(r'//.*|\s+')
+_RE_SANITIZE_BUFFER = re.compile(r'//[^\n]*|[^\S\n]+')
+_RE_SANITIZE_BYTES = re.compile(rb'//[^\n]*|[^\S\n]+')
+
+# Wildcards of glob patterns, as checked by glob.has_magic
+_RE_GLOB_MAGIC = re.compile('[*?[]')
+
+
+def _buildctable():
+    """ Precomputes instruction word of every legal dest=comp;jmp spelling.
+
+    Returns:
+        table (dict of str: int): Sanitized C-instruction mapped to its 16-bit
+            instruction word.
+
+    """
+    table = {}
+    for dest, dest_bin in _DEST_TABLE.items():
+        dest_str = '' if dest == 'None' else dest + '='
+        for comp, comp_bin in _COMP_TABLE.items():
+            for jmp, jmp_bin in _JMP_TABLE.items():
+                jmp_str = '' if jmp == 'None' else ';' + jmp
+                table[dest_str + comp + jmp_str] = \
+                    comp_bin << 6 | dest_bin << 3 | jmp_bin
+    return table
+
+
+# Built once at import, single lookup per C-instruction
+_C_TABLE = _buildctable()
+_C_TABLE_BYTES = {line.encode(): word for line, word in _C_TABLE.items()}
+
+
+@lru_cache(maxsize=None)
+def _builddfa():
+    """ Builds deterministic automaton classifying sanitized lines.
+
+        C-instructions are a trie of all spellings in _C_TABLE, A-
+        instructions are '@' followed by digits or a symbol and labels a
+        symbol in parentheses. Any other character sequence has no
+        transition, so lines are rejected on their first illegal character.
+
+        Only lines missing from _C_TABLE are scanned, so the automaton is
+        built once on first use instead of at import.
+
+    Returns:
+        delta (list of dict of str: int): Transitions per state, state 0
+            starts.
+        accept (dict of int: tuple): Kind of line and instruction word of
+            C-instructions per accepting state.
+
+    """
+    delta = [{}]
+    accept = {}
+
+    def newstate(kind=None, word=None):
+        delta.append({})
+        if kind is not None:
+            accept[len(delta) - 1] = (kind, word)
+        return len(delta) - 1
+
+    for line, word in _C_TABLE.items():
+        state = 0
+        for char in line:
+            if char not in delta[state]:
+                delta[state][char] = newstate()
+            state = delta[state][char]
+        accept[state] = ('c_type', word)
+
+    delta[0]['@'] = address = newstate()
+    number = newstate('a_number')
+    symbol = newstate('a_symbol')
+    delta[0]['('] = label_open = newstate()
+    label = newstate()
+    label_close = newstate('label')
+    for char in _DIGITS:
+        delta[address][char] = delta[number][char] = number
+    for char in _SYMBOL_START:
+        delta[address][char] = symbol
+        delta[label_open][char] = label
+    for char in _SYMBOL_CHARS:
+        delta[symbol][char] = symbol
+        delta[label][char] = label
+    delta[label][')'] = label_close
+    return delta, accept
+
+
+def _scan(line):
+    """ Classifies and encodes a sanitized line in one left-to-right scan.
+
+    Args:
+        line (str): Fully sanitized line.
+
+    Returns:
+        kind (str): 'c_type', 'a_number', 'a_symbol' or 'label', None when
+            line is rejected.
+        value (int or str): Instruction word of C-instruction, address of
+            numeric A-instruction or symbol of symbolic A-instruction and
+            label.
+
+    """
+    state = 0
+    delta, accept = _builddfa()
+    for char in line:
+        state = delta[state].get(char)
+        if state is None:  # No transition, reject immediately
+            return None, None
+    kind, word = accept.get(state, (None, None))
+    if kind == 'a_number':
+        return kind, int(line[1:])
+    elif kind == 'a_symbol':
+        return kind, line[1:]
+    elif kind == 'label':
+        return kind, line[1:-1]
+    return kind, word
+
+
+def _isvalidsymbol(symbol):
+    """ Checks that symbol has only allowed characters, no leading digit """
+    return symbol != '' and symbol[0] in _SYMBOL_START and \
+        not symbol.translate(_NONSYMBOL)
+
+
+class _nullphase(object):
+    """ Phase of untimed assembly, see phasetimer. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# Shared no-op phase of untimed assembly, reusable as it keeps no state
+_NULLPHASE = _nullphase()
+
+# Instruction type per kind code of assembled
+_KINDS = ('a_type', 'c_type')
+_KIND_CODES = {itype: code for code, itype in enumerate(_KINDS)}
+
+# On demand view of a single assembled instruction, attributes as parseline
+instruction = namedtuple('instruction', ['line', 'line_loc', 'type',
+                                         'binary'])
+
+# Outcome of assembling a single file in batch mode
+jobresult = namedtuple('jobresult', ['asmfile', 'written', 'errors',
+                                     'seconds', 'error', 'cached', 'hits',
+                                     'misses'])
 
 
 class parseline(object):
@@ -14,22 +215,27 @@ class parseline(object):
         symbolics (symboltable): optional reference to symbolic table
             instance.
         type (str): a_type or c_type instruction
-        binary (str(016b)): binary string of parsed instruction.
+        binary (int): 16-bit instruction word of parsed instruction.
 
     Todo:
 
     """
 
-    def __init__(self, line, line_loc=None, symbolics=None):
-        self.line = _sanitizeline(line)
+    def __init__(self, line, line_loc=None, symbolics=None, sanitized=False):
+        self.line = line if sanitized else _sanitizeline(line)
         self.line_loc = line_loc
-        self.type, self.binary = self.subclass(line, line_loc, symbolics)
+        self.type, self.binary = self.subclass(self.line, line_loc,
+                                               symbolics)
 
     def subclass(self, line, line_loc, symbolics):
         """ Defines line type and parses to binary.
 
-            Code parsing can incorrectly succeed for instructions, e.g.:
-                'Memory=Address' will return line.binary=='1111110000000000'
+            Canonical C-instructions resolve with a single lookup in the
+            precomputed table. Other lines are classified in one
+            left-to-right scan by the strict automaton of _scan, which
+            accepts only complete A-instructions and labels, and rejects
+            anything else on its first illegal character, e.g.
+            'Memory=Address' on its second character.
 
         Args:
             line (str): line from asm, usually sanitized.
@@ -39,65 +245,69 @@ class parseline(object):
 
         Returns:
             type (str): instruction type identification as a_type or c_type.
-            binary (str(016b)): binary string of parsed instruction.
+            binary (int): 16-bit instruction word of parsed instruction.
 
         Raises:
-            ParseError of 'Unknown'-type when instruction fails all parsing.
+            ParseError of 'Unknown'-type when instruction fails all parsing,
+                of 'a-type' when given a malformed A-instruction or a
+                variable with no symboltable and of 'Overflow'-type when
+                given an address over 15 bits.
 
         """
-        dest, comp, jmp = self.code_parse(line)
-        if line[0] == "@":  # Address type instruction
-            return 'a_type', self.address_parse(line[1:], line_loc, symbolics)
-        elif comp:  # Calculation type instruction
-            return 'c_type', comp + dest + jmp
-        # Following cases cover some poor entry line sanitization
-        elif line[0] == '(' and line[-1] == ')':
-            return None, ''
-        elif line == '':
-            return None, ''
-        else:
-            raise ParseError(line, line_loc)
-            return None, ''
+        if line == '':
+            return None, None
+        binary = _C_TABLE.get(line)
+        if binary is not None:  # Calculation type instruction
+            return 'c_type', binary
+        kind, value = _scan(line)  # Never a C-instruction missing from table
+        if kind == 'a_number':  # Address type instruction
+            if value > _ADDRESS_MAX:
+                raise ParseError(line, line_loc, itype="Overflow")
+            return 'a_type', value
+        elif kind == 'a_symbol':
+            if symbolics is None:
+                raise ParseError(line, line_loc, itype="a-type")
+            return 'a_type', symbolics.address(value, line_loc)
+        elif kind == 'label':  # Covers some poor entry line sanitization
+            return None, None
+        elif line[0] == "@":
+            raise ParseError(line, line_loc, itype="a-type")
+        raise ParseError(line, line_loc)
 
     def address_parse(self, line, line_loc, symbolics):
-        """ Parses address to binary value.
+        """ Parses address to instruction word.
 
-            Resolves integer address to binary. If string and not in
-            symboltable class resolves to a new key, otherwise returns found
-            value.
+            Scans '@' + line as subclass does. Constants must be plain
+            decimal digits, new symbols must be valid and constants as well
+            as label and variable addresses must fit in 15 bits, e.g.
+            '@32768' would otherwise be written as a C-instruction.
 
         Args:
-            line (str): line identified with @ as first character.
-                Can contain any characters, (usually) with whitespace and
-                comments removed.
+            line (str): line identified with @ as first character, without
+                it. Fully sanitized.
             line_loc (int): specifies line number. Accepts None.
             symbolics (symboltable): reference to symbolic table instance.
                 Accepts None.
 
         Returns:
-            binary (str(016b)): binary valued string of resolved address.
+            binary (int): resolved address as instruction word.
 
         Raises:
-            ParseError when given a variable address with no symboltable.
+            ParseError when given a variable address with no symboltable,
+                an invalid symbol, a malformed constant or an address over
+                15 bits.
 
         """
-        try:
-            binary = format(int(line), '016b')
-        except ValueError:
-            if symbolics is not None:
-                binary = symbolics.resolve(line)
-            else:
-                raise ParseError(line, self.line_loc, type="a-type")
-                binary = None
-        return binary
+        return self.subclass('@' + line, line_loc, symbolics)[1]
 
     def code_parse(self, line):
-        """Translates C-command type to binary representation.
+        """Translates C-command type to instruction fields.
 
             Does not raise errors with failed parse, comp is not None
-            identifies succesful parse.
+            identifies succesful parse. Only complete C-instructions are
+            accepted, trailing characters fail the parse.
 
-            comp + dest + jmp creates a valid hack (016b) instruction.
+            comp << 6 | dest << 3 | jmp creates a valid hack instruction word.
 
         Args:
             line (str): Any string with possible c-type parsing.
@@ -105,57 +315,16 @@ class parseline(object):
                 comments removed. Prefers sanitized strings.
 
         Returns:
-            dest (str(010b)): binary representation of parsed destination
-            comp (str(03b)): binary representation of parsed computation
-            jmp (str(03b)): binary representation of parsed jump
+            dest (int): 3-bit field of parsed destination
+            comp (int): 10-bit field of parsed computation, including the
+                leading C-instruction bits
+            jmp (int): 3-bit field of parsed jump
 
         """
-
-        # Regular expression parsing, with longer matches first
-        # Re always succeeds at finding the matching instruction
-        _re_comp = (r"(D\|A|D&A|A-D|D-A|D\+A|A-1|D-1|A\+1|D\+1|"
-                    r"D\|M|D&M|M-D|D-M|D\+M|M-1|M\+1|-M|!M|M|"
-                    r"-A|-D|!A|!D|A|D|-1|1|0?)")
-        _re_dest = r"((AMD|AD|AM|MD|A|M|D)=)?"
-        _re_jmp = r"(;(JGT|JEQ|JGE|JLT|JNE|JLE|JMP))?"
-
-        _re_line = re.compile('{0}{1}{2}'.format(_re_dest, _re_comp, _re_jmp))
-
-        grouped_c = re.match(_re_line, line)
-
-        # C-command parsing dictionaries:
-        comp_table = {
-            '0': '1110101010', '1': '1110111111', '-1': '1110111010',
-            'D': '1110001100', 'A': '1110110000', '!D': '1110001101',
-            '!A': '1110110001', '-D': '1110001111', '-A': '1110110011',
-            'D+1': '1110011111', 'A+1': '1110110111', 'D-1': '1110001110',
-            'A-1': '1110110010', 'D+A': '1110000010', 'D-A': '1110010011',
-            'A-D': '1110000111', 'D&A': '1110000000', 'D|A': '1110010101',
-            'M': '1111110000', '!M': '1111110001', '-M': '1111110011',
-            'M+1': '1111110111', 'M-1': '1111110010', 'D+M': '1111000010',
-            'D-M': '1111010011', 'M-D': '1111000111', 'D&M': '1111000000',
-            'D|M': '1111010101'
-        }
-
-        dest_table = {
-            'None': '000', 'M': '001', 'D': '010', 'MD': '011',
-            'A': '100', 'AM': '101', 'AD': '110', 'AMD': '111'
-        }
-
-        jmp_table = {
-            'None': '000', 'JGT': '001', 'JEQ': '010', 'JGE': '011',
-            'JLT': '100', 'JNE': '101', 'JLE': '110', 'JMP': '111'
-        }
-
-        # Parse according to dictionaries
-        dest = dest_table[str(grouped_c.group(2))]
-        if grouped_c.group(3):
-            comp = comp_table[str(grouped_c.group(3))]
-        else:
-            comp = None
-        jmp = jmp_table[str(grouped_c.group(5))]
-
-        return dest, comp, jmp
+        kind, word = _scan(line)
+        if kind != 'c_type':
+            return _DEST_TABLE['None'], None, _JMP_TABLE['None']
+        return word >> 3 & 0b111, word >> 6, word & 0b111
 
 
 class symboltable(object):
@@ -164,17 +333,24 @@ class symboltable(object):
     Attributes:
         lines (list of str): List of (sanitized) commands with comments, empty
             lines and spaces removed. Can be directly parsed.
-        table (dict of str: str(016b)): Dictionary of pre-initialized symbolic
-            label values.
+        table (dict of str: int): Dictionary of pre-initialized symbolic
+            label addresses.
         used (int): Number of registries used, including 0-registry.
+        addresses (dict of str: int): Per-file cache of resolved symbolic
+            A-instruction lines, e.g. '@LOOP', on top of resolve.
+        lookups (int): Number of resolve calls finding an existing symbol.
+        allocations (int): Number of resolve calls allocating a variable.
 
     Todo:
         *Check for exceeding memory space for variables, exception
     """
 
-    def __init__(self, lines):
-        self.lines = self._sanitizeasm(lines)
+    def __init__(self, lines, sanitized=False):
+        self.lines = lines if sanitized else self._sanitizeasm(lines)
         self.table = self.inittable(self.lines)
+        self.addresses = {}
+        self.lookups = 0
+        self.allocations = 0
 
     def __getitem__(self, i):
         """ Defines instance[symbolic key] syntax for class """
@@ -183,33 +359,53 @@ class symboltable(object):
     def resolve(self, label):
         """ Resolves label by returning dictionary value or creating new key.
 
-            New keys are assigned binary valued addresses after pre-assigned
-            register values (starting from register 16).
+            New keys are assigned addresses after pre-assigned register values
+            (starting from register 16).
 
         Args:
             label (str): Symbolic label or variable to resolve.
 
         Returns:
-            binary (str(016b)): Resolved binary valued address.
+            binary (int): Resolved address.
 
         """
         try:
             binary = self.table[label]
+            self.lookups += 1
         except KeyError:
             self.used += 1
-            self.table[label] = format(int(self.used), '016b')
+            self.allocations += 1
+            self.table[label] = self.used
             binary = self.table[label]
         return binary
 
+    def address(self, symbol, line_loc=None):
+        """ Resolves symbol of an A-instruction, checking its range.
+
+            All assembly modes encode symbolic A-instructions through here,
+            so labels and variables past 15 bits fail alike everywhere
+            instead of being written as C-instructions.
+
+        Args:
+            symbol (str): Symbolic label or variable to resolve.
+            line_loc (int): Line number for error reporting.
+
+        Returns:
+            binary (int): Resolved address as instruction word.
+
+        Raises:
+            ParseError of 'Overflow'-type when address exceeds 15 bits.
+
+        """
+        binary = self.resolve(symbol)
+        if binary > _ADDRESS_MAX:
+            raise ParseError('@' + symbol, line_loc, itype="Overflow")
+        return binary
+
     @staticmethod
     def _sanitizeasm(lines):
         """ Fully sanitizes all lines, removing leftover empty lines. """
-        sane_lines = []
-        for line in lines:
-            sane_line = _sanitizeline(line)
-            if sane_line:
-                sane_lines.append(sane_line)
-        return sane_lines
+        return _sanitizebuffer('\n'.join(lines))
 
     def inittable(self, lines):
         """ Initializes symbolic table with pre-set values and asm labels.
@@ -221,22 +417,15 @@ class symboltable(object):
             table (dict): Dictionary with label|variable: address pairs.
 
         """
-        table = {'R' + str(i): format(i, '016b') for i in range(16)}
-        table['SP'] = format(0, '016b')
-        table['LCL'] = format(1, '016b')
-        table['ARG'] = format(2, '016b')
-        table['THIS'] = format(3, '016b')
-        table['THAT'] = format(4, '016b')
-        table['SCREEN'] = format(16384, '016b')
-        table['KBD'] = format(24576, '016b')
+        table = dict(_PREDEFINED)
 
         self.used = 15  # pre-used registers 0-15
 
         c_idx = 0
         c_lines = []
         for i, line in enumerate(lines):
-            if line[0] == '(' and line[-1] == ')':
-                table[line[1:-1]] = format(c_idx, "016b")
+            if _islabel(line):
+                table[line[1:-1]] = c_idx
             else:
                 c_idx += 1
                 c_lines.append(i)
@@ -249,24 +438,600 @@ class symboltable(object):
         return table
 
 
+class assembled(object):
+    """ Compact result of assembly in parallel arrays.
+
+    Costs a few bytes per instruction instead of a parseline instance with
+    its attribute dictionary. Indexing and iteration create instruction
+    views on demand, with the source line looked up from the sanitized
+    lines of the symboltable for error handling.
+
+    Attributes:
+        words (array of int): 16-bit instruction words.
+        kinds (array of int): Kind code per instruction, index to _KINDS.
+        locs (array of int): line_loc per instruction.
+        lines (list of str): Optional sanitized instruction lines, indexed
+            by line_loc - 1.
+
+    """
+
+    __slots__ = ('words', 'kinds', 'locs', 'lines')
+
+    def __init__(self, lines=None):
+        self.words = array('H')
+        self.kinds = array('B')
+        self.locs = array('L')
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, i):
+        """ Defines instance[i] syntax, returning an instruction view """
+        line_loc = self.locs[i]
+        line = self.lines[line_loc - 1] if self.lines is not None else None
+        if isinstance(line, bytes):  # Lines of mapped are never decoded
+            line = line.decode()
+        return instruction(line, line_loc, _KINDS[self.kinds[i]],
+                           self.words[i])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.words)))
+
+    def append(self, word, itype, line_loc):
+        """ Adds instruction, raises OverflowError if word exceeds 16 bits """
+        self.words.append(word)  # First, fails before other arrays change
+        self.kinds.append(_KIND_CODES[itype])
+        self.locs.append(line_loc)
+
+
+class encodecache(object):
+    """ Bounded memo of instruction encodings independent of symbols.
+
+    Generated asm repeats a small set of instructions, e.g. '@SP' and
+    'AM=M-1', thousands of times. C-instructions and numeric A-instructions
+    are cached by sanitized line, so repeats skip parseline entirely. Once
+    full the oldest entries are dropped first.
+
+    Attributes:
+        maxsize (int): Maximum number of cached lines.
+        table (dict of str: tuple): Instruction type and word per line.
+        hits (int): Number of lookups served from cache.
+        misses (int): Number of lookups parsed.
+
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, line, line_loc, symbolics):
+        """ Encodes sanitized instruction line, using caches where possible.
+
+            Symbolic A-instructions are cached per file in the addresses of
+            symbolics instead, since their value depends on the symbol table.
+
+        Args:
+            line (str): Fully sanitized instruction line.
+            line_loc (int): Line number for error reporting.
+            symbolics (symboltable): Symbols of the assembled file.
+
+        Returns:
+            type (str): instruction type identification as a_type or c_type.
+            binary (int): 16-bit instruction word of parsed instruction.
+
+        Raises:
+            ParseError when instruction fails all parsing.
+
+        """
+        entry = self.table.get(line)
+        if entry is None:
+            address = symbolics.addresses.get(line)
+            if address is not None:
+                self.hits += 1
+                return 'a_type', address
+        else:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        parsedline = parseline(line, line_loc, symbolics, sanitized=True)
+        entry = parsedline.type, parsedline.binary
+        if line[0] == '@' and line[1:] in symbolics.table:
+            symbolics.addresses[line] = parsedline.binary
+        else:
+            if len(self.table) >= self.maxsize:
+                del self.table[next(iter(self.table))]
+            self.table[line] = entry
+        return entry
+
+    def hitrate(self):
+        """ Returns share of lookups served from cache """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class assemblysession(object):
+    """ Keeps assembly state between edits for incremental re-encoding.
+
+    After an edit only the changed instructions are re-encoded, together
+    with instructions referring to labels or variables whose address moved.
+    Labels and variables are recomputed with cheap scans over the kept
+    sanitized lines, so reassembly after a small edit takes milliseconds
+    even for Pong-sized programs.
+
+    Attributes:
+        source (list of str): Lines of asm as given.
+        sane (list of str): Sanitized line per source line, empty for
+            lines without instruction.
+        lines (list of str): Sanitized instruction lines, labels removed.
+        refs (list of str): Symbolic reference per instruction, None for
+            numeric and C-instructions.
+        words (list of int): Instruction word per instruction, None where
+            parsing failed.
+        errors (dict of int: ParseError): Failed parse per instruction.
+        symbolics (symboltable): Labels and variables of current source.
+        encoded (int): Number of instructions encoded by last update.
+        cache (encodecache): Encodings kept between updates.
+
+    """
+
+    def __init__(self, lines, cache=None):
+        self.cache = encodecache() if cache is None else cache
+        self.source = []
+        self.sane = []
+        self.lines = []
+        self.refs = []
+        self.words = []
+        self.errors = {}
+        self.symbolics = symboltable([])
+        self.encoded = 0
+        self.update(0, 0, lines)
+
+    def edit(self, index, line):
+        """ Replaces single source line at index, see update. """
+        return self.update(index, index + 1, [line])
+
+    def update(self, start, stop, lines):
+        """ Replaces source lines start:stop and re-encodes what changed.
+
+        Args:
+            start (int): Index of first replaced source line.
+            stop (int): Index after last replaced source line, equal to start
+                for pure insertion.
+            lines (list of str): New asm lines.
+
+        Returns:
+            changed (list of int): Indices of re-encoded instructions.
+
+        """
+        sane = [_sanitizeline(line) for line in lines]
+        first = sum(1 for line in self.sane[:start] if _isinstruction(line))
+        removed = sum(1 for line in self.sane[start:stop]
+                      if _isinstruction(line))
+        added = [line for line in sane if _isinstruction(line)]
+
+        self.source[start:stop] = lines
+        self.sane[start:stop] = sane
+        self.lines[first:first + removed] = added
+        self.refs[first:first + removed] = [_symbolref(line) for line in added]
+        self.words[first:first + removed] = [None] * len(added)
+        if removed != len(added):  # Shift errors of later instructions
+            shift = len(added) - removed
+            errors = {}
+            for i, err in self.errors.items():
+                if i < first:
+                    errors[i] = err
+                elif i >= first + removed:  # Reported at its new line
+                    errors[i + shift] = ParseError(err.line, i + shift + 1,
+                                                   err.type)
+            self.errors = errors
+
+        moved = self._resolve()
+        changed = set(range(first, first + len(added)))
+        if moved:
+            changed.update(i for i, ref in enumerate(self.refs)
+                           if ref in moved)
+        for i in sorted(changed):
+            self._encode(i)
+        self.encoded = len(changed)
+        return sorted(changed)
+
+    def write(self, outfile, fmt='hack', byteorder='little'):
+        """ Writes words of successfully parsed instructions as main. """
+        write((word for word in self.words if word is not None), outfile,
+              fmt, byteorder)
+
+    def _resolve(self):
+        """ Recomputes labels and variables of current source.
+
+        Returns:
+            moved (set of str): Symbols added, removed or given a new address.
+
+        """
+        symbolics = symboltable([])
+        c_idx = 0
+        for line in self.sane:
+            if not line:
+                continue
+            if _islabel(line):
+                symbolics.table[line[1:-1]] = c_idx
+            else:
+                c_idx += 1
+        for ref in self.refs:  # Variables in order of first use
+            if ref is not None and (ref in symbolics.table or
+                                    _isvalidsymbol(ref)):
+                symbolics.resolve(ref)
+
+        old, new = self.symbolics.table, symbolics.table
+        self.symbolics = symbolics
+        return {symbol for symbol in old.keys() | new.keys()
+                if old.get(symbol) != new.get(symbol)}
+
+    def _encode(self, i):
+        """ Encodes instruction i with current symbol table. """
+        self.errors.pop(i, None)
+        try:
+            self.words[i] = self.cache.encode(self.lines[i], i + 1,
+                                              self.symbolics)[1]
+        except ParseError as err:
+            self.words[i] = None
+            self.errors[i] = err
+
+
+class phasetimer(object):
+    """ Records wall time and peak memory per phase of assembly.
+
+    Assembly functions taking a timer wrap each phase in timer.phase(name),
+    untimed assembly only enters a shared no-op context per phase. Peak
+    memory is traced with tracemalloc, which slows assembly down noticeably
+    while enabled.
+
+    Attributes:
+        memory (bool): Trace peak memory of each phase.
+        sink (instrumentation): Optional receiver of a span per phase.
+        phases (list of tuple): Name, wall time in seconds and peak traced
+            bytes, None without memory tracing, per finished phase.
+
+    """
+
+    def __init__(self, memory=True, sink=None):
+        self.memory = memory
+        self.sink = sink
+        self.phases = []
+        self._tracing = False
+        if memory:
+            import tracemalloc
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+
+    def phase(self, name):
+        """ Returns context timing the enclosed block as phase name. """
+        return _timedphase(self, name)
+
+    def stop(self):
+        """ Stops memory tracing if started by this timer. """
+        if self._tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._tracing = False
+
+    def report(self):
+        """ Returns a table of phase timings as text. """
+        rows = ['{0:<10} {1:>10} {2:>10}'.format('phase', 'ms', 'peak MB')]
+        for name, seconds, peak in self.phases:
+            rows.append('{0:<10} {1:>10.3f} {2:>10}'.format(
+                name, seconds * 1000,
+                '-' if peak is None else '{0:.3f}'.format(peak / 2**20)))
+        rows.append('{0:<10} {1:>10.3f}'.format(
+            'total', sum(seconds for _, seconds, _ in self.phases) * 1000))
+        return '\n'.join(rows)
+
+
+class _timedphase(object):
+    """ Context of a single phase of a phasetimer. """
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.timer.memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak = None
+        if self.timer.memory:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1]
+        self.timer.phases.append((self.name, seconds, peak))
+        if self.timer.sink is not None:
+            self.timer.sink.span(self.name, seconds)
+        return False
+
+
+class diagnostics(object):
+    """ Collects parse errors in memory and writes them to log at once.
+
+    Reporting an error only appends to a list, the log-file is written by
+    write once assembly is done. Assembly can be cut short after a number of
+    errors or on the first one.
+
+    Attributes:
+        path (str): Filepath to log-file, None disables the log-file.
+        fmt (str): Log format, 'text' lines or 'jsonl' JSON lines.
+        max_errors (int): Optional number of errors aborting assembly.
+        fail_fast (bool): Abort assembly on first error.
+        echo (bool): Print each error to prompt when reported.
+        echofile (file object): Stream errors are echoed to, None prints to
+            stdout, e.g. sys.stderr when stdout carries output.
+        asmfile (str): asm-file currently assembled, recorded with errors.
+        errors (list of tuple): asmfile and ParseError per reported error.
+
+    """
+
+    def __init__(self, path='./log.txt', fmt='text', max_errors=None,
+                 fail_fast=False, echo=True):
+        self.path = path
+        self.fmt = fmt
+        self.max_errors = max_errors
+        self.fail_fast = fail_fast
+        self.echo = echo
+        self.echofile = None
+        self.asmfile = None
+        self.errors = []
+
+    def __len__(self):
+        return len(self.errors)
+
+    def report(self, err):
+        """ Records a parse error.
+
+        Args:
+            err (ParseError): Failed parse to record.
+
+        Raises:
+            ParseError when failing fast.
+            LimitError when max_errors is reached.
+
+        """
+        self.errors.append((self.asmfile, err))
+        if self.echo:
+            print(err, file=self.echofile)
+        if self.fail_fast:
+            raise err
+        if self.max_errors is not None and \
+                len(self.errors) >= self.max_errors:
+            raise LimitError(len(self.errors))
+
+    def extend(self, errors):
+        """ Adds errors collected elsewhere, e.g. in a worker process. """
+        self.errors.extend(errors)
+
+    def write(self, path=None):
+        """ Writes all collected errors to log-file, if there are any. """
+        path = path or self.path
+        if path is None or not self.errors:
+            return
+        with open(path, 'w') as log:
+            if self.fmt == 'jsonl':
+                import json
+                log.writelines(json.dumps({
+                    'file': asmfile, 'line_loc': err.line_loc,
+                    'line': err.line, 'type': err.type}) + '\n'
+                    for asmfile, err in self.errors)
+            else:
+                log.writelines(('{0}: {1}\n' if asmfile else '{1}\n').format(
+                    asmfile, err) for asmfile, err in self.errors)
+
+
+class instrumentation(object):
+    """ Receiver of assembly counters and phase spans, does nothing.
+
+    Subclass and override count and span to export metrics of embedded
+    assembly, see assemblercontext for the emitted names. Both are called
+    once per counter or phase of each assembled program, never per line.
+
+    Attributes:
+        asmfile (str): asm-file currently assembled, None for in-memory
+            input.
+
+    """
+
+    def __init__(self):
+        self.asmfile = None
+
+    def count(self, name, value):
+        """ Receives counter name with its value for the current program. """
+
+    def span(self, name, seconds):
+        """ Receives wall time of phase name of the current program. """
+
+
+class jsonlsink(instrumentation):
+    """ Writes counters and spans as JSON lines to an open text file.
+
+        Each event is a single object, e.g.
+        {"file": "Pong.asm", "count": "instructions", "value": 27483}.
+
+    Attributes:
+        file (file object): Text file receiving the JSON lines.
+
+    """
+
+    def __init__(self, file):
+        super().__init__()
+        self.file = file
+
+    def count(self, name, value):
+        import json
+        self.file.write(json.dumps({'file': self.asmfile, 'count': name,
+                                    'value': value}) + '\n')
+
+    def span(self, name, seconds):
+        import json
+        self.file.write(json.dumps({'file': self.asmfile, 'span': name,
+                                    'seconds': seconds}) + '\n')
+
+
+class assemblercontext(object):
+    """ Owns all mutable state of assembly, for use from many threads.
+
+    Configuration, diagnostics, encoding cache and symbol table of the last
+    assembled program live here instead of in the module, so programs
+    assembled with separate contexts share nothing. Give each thread its own
+    context, e.g. one per task of a ThreadPoolExecutor, and reuse it for
+    successive programs of that thread to keep its encoding cache warm.
+
+    With a sink each assembled program emits the counters instructions,
+    a_instructions and c_instructions, except in stream and pipe,
+    symbol_lookups and variable_allocations of symboltable.resolve,
+    cache_hits, cache_misses, errors and bytes_written for asm-files and
+    streams, followed by a span per phase and a total span.
+
+    Attributes:
+        fmt (str): Output format, 'hack' text or 'bin' packed ROM image.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        log (diagnostics): Collector of parse errors, by default collects
+            silently without a log-file.
+        cache (encodecache): Encodings shared by programs of this context.
+        symbolics (symboltable): Symbols of the last assembled program.
+        timer (phasetimer): Optional timer of assembly phases.
+        sink (instrumentation): Optional receiver of counters and spans.
+
+    """
+
+    def __init__(self, fmt='hack', byteorder='little', log=None,
+                 cachesize=4096, timer=None, sink=None):
+        self.fmt = fmt
+        self.byteorder = byteorder
+        self.log = diagnostics(path=None, echo=False) if log is None else log
+        self.cache = encodecache(cachesize)
+        self.symbolics = None
+        self.timer = timer
+        self.sink = sink
+
+    def main(self, asmfile, outputdir=None):
+        """ Assembles asm-file as main, returns parsed instructions. """
+        start = self._begin(asmfile)
+        parsed, self.symbolics = main(asmfile, outputdir, self.fmt,
+                                      self.byteorder, self.log, self.cache,
+                                      self._timer())
+        self._emit(start, len(parsed), parsed.words, True)
+        return parsed
+
+    def stream(self, asmfile, outputdir=None):
+        """ Assembles asm-file as stream, returns written and failed. """
+        start = self._begin(asmfile)
+        written, failed, self.symbolics = stream(
+            asmfile, outputdir, self.fmt, self.byteorder, self.log,
+            self.cache)
+        self._emit(start, written, None, True)
+        return written, failed
+
+    def pipe(self, srcfile, destfile):
+        """ Assembles asm stream as pipe, returns written and failed. """
+        start = self._begin(getattr(srcfile, 'name', None))
+        written, failed, self.symbolics = pipe(
+            srcfile, destfile, self.fmt, self.byteorder, self.log, self.cache)
+        self._emit(start, written, None, True)
+        return written, failed
+
+    def mapped(self, asmfile, outputdir=None):
+        """ Assembles asm-file as mapped, returns parsed instructions. """
+        start = self._begin(asmfile)
+        parsed, self.symbolics = mapped(asmfile, outputdir, self.fmt,
+                                        self.byteorder, self.log,
+                                        self._timer())
+        self._emit(start, len(parsed), parsed.words, True)
+        return parsed
+
+    def assemble_lines(self, lines, container='array'):
+        """ Assembles asm lines in memory, returns instruction words. """
+        start = self._begin(None)
+        words, self.symbolics, _ = assemble_lines(lines, self.log, container,
+                                                  self.cache)
+        self._emit(start, len(words), words, False)
+        return words
+
+    def assemble_bytes(self, buffer, container='array'):
+        """ Assembles asm bytes in memory, returns instruction words. """
+        start = self._begin(None)
+        words, self.symbolics, _ = assemble_bytes(buffer, self.log,
+                                                  container)
+        self._emit(start, len(words), words, False)
+        return words
+
+    def _timer(self):
+        """ Returns timer of phases, forwarding spans to sink if set. """
+        if self.timer is None and self.sink is not None:
+            return phasetimer(memory=False, sink=self.sink)
+        return self.timer
+
+    def _begin(self, asmfile):
+        """ Snapshots counters before assembly, None without a sink. """
+        if self.sink is None:
+            return None
+        self.sink.asmfile = asmfile
+        return (time.perf_counter(), self.cache.hits, self.cache.misses,
+                len(self.log))
+
+    def _emit(self, start, written, words, tofile):
+        """ Sends counters of the assembled program to sink. """
+        if start is None:
+            return
+        seconds, hits, misses, errors = start
+        sink = self.sink
+        sink.count('instructions', written)
+        if words is not None:
+            c_count = sum(word >> 15 for word in words)
+            sink.count('a_instructions', len(words) - c_count)
+            sink.count('c_instructions', c_count)
+        sink.count('symbol_lookups', self.symbolics.lookups)
+        sink.count('variable_allocations', self.symbolics.allocations)
+        sink.count('cache_hits', self.cache.hits - hits)
+        sink.count('cache_misses', self.cache.misses - misses)
+        sink.count('errors', len(self.log) - errors)
+        if tofile:
+            linesize = 2 if self.fmt == 'bin' else 16 + len(os.linesep)
+            sink.count('bytes_written', written * linesize)
+        sink.span('total', time.perf_counter() - seconds)
+
+
 class ParseError(Exception):
     """ Exception raised for failed parse.
 
-    Outputs to log-file in working directory
+    Collected by diagnostics, which outputs to log-file.
     """
 
-    def __init__(self, line, line_loc, path='./log.txt', itype='Unknown'):
+    def __init__(self, line, line_loc, itype='Unknown'):
+        super().__init__(line, line_loc, itype)  # Keeps errors picklable
         self.line = line
         self.line_loc = line_loc
-        self.type = type
-        self.printlog(line, line_loc, path, itype)
-        self.path = path
+        self.type = itype
+
+    def __str__(self):
+        return "{2} Error parsing {0}: {1}".format(self.line_loc, self.line,
+                                                   self.type)
 
-    def printlog(self, line, line_loc, path, itype):
-        """ Prints log-file """
-        with open(path, 'w') as log:
-            print("{2} Error parsing {0}: {1}".format(line_loc, line, itype),
-                  file=log)
+
+class LimitError(Exception):
+    """ Exception raised when number of parse errors reaches the limit """
+
+    def __init__(self, count):
+        super().__init__(count)
+        self.count = count
+
+    def __str__(self):
+        return "Aborted after {0} errors".format(self.count)
 
 
 class InputError(Exception):
@@ -277,21 +1042,471 @@ class InputError(Exception):
         self.message = message
 
 
+def _untimed(name):
+    """ Returns the shared no-op phase of untimed assembly. """
+    return _NULLPHASE
+
+
 def _sanitizeline(line):
     """ Sanitizes input asm lines by removing all whitespace and comments """
-    line = re.sub(r'\s', '', re.split(r'//', line)[0])
-    return line
+    return _RE_SANITIZE_LINE.sub('', line)
+
+
+def _sanitizebuffer(text):
+    """ Sanitizes whole asm text in one pass.
+
+        Strips comments and whitespace of all lines with a single regular
+        expression substitution over the buffer, instead of two per line.
+
+    Args:
+        text (str): asm text with lines separated by newlines.
+
+    Returns:
+        lines (list of str): Fully sanitized lines, empty lines removed.
+
+    """
+    return [line for line in _RE_SANITIZE_BUFFER.sub('', text).split('\n')
+            if line]
+
+
+def _sanitizestream(srcfile, blocksize=2**20):
+    """ Yields fully sanitized lines of an open asm-file.
+
+        Lines are read and sanitized in blocks of about blocksize characters,
+        so memory use stays bounded for any file size.
+
+    """
+    for block in iter(lambda: srcfile.readlines(blocksize), []):
+        yield from _sanitizebuffer(''.join(block))
+
+
+def _isinstruction(line):
+    """ Checks whether sanitized line is an instruction, not label or empty """
+    return bool(line) and not _islabel(line)
+
+
+def _islabel(line):
+    """ Checks whether sanitized line is a label with a valid symbol. """
+    return line[0] == '(' and line[-1] == ')' and _isvalidsymbol(line[1:-1])
+
+
+def _symbolref(line):
+    """ Returns symbol of a symbolic A-instruction, otherwise None. """
+    if line[0] != '@' or line[1:2].isdigit():
+        return None
+    return line[1:]
+
+
+def _outpath(asmfile, outputdir=None, fmt='hack'):
+    """ Creates output filepath from asm filepath, output dir and format. """
+    if outputdir is None:  # Use asm filepath to create hackfile
+        return re.sub(r'(asm)$', fmt, asmfile)
+    return outputdir + os.path.splitext(os.path.split(asmfile)[1])[0] + '.' \
+        + fmt
+
+
+def _encodeword(word, fmt='hack', byteorder='little'):
+    """ Encodes a single instruction word to its output bytes.
+
+        Both formats have a fixed width per word: a hack text line or a
+        packed 16-bit word in given byte order.
+
+    """
+    if fmt == 'bin':
+        return word.to_bytes(2, byteorder)
+    return (format(word, '016b') + os.linesep).encode()
+
+
+def _patchwords(destfile, positions, word, fmt='hack', byteorder='little'):
+    """ Overwrites already written words at given positions in place.
+
+        Every word has a fixed width in output, so word positions map
+        directly to byte offsets. Write position is restored to end of file
+        afterwards.
+
+    Args:
+        destfile (file): Output opened in binary mode.
+        positions (list of int): Zero-based indices of words to overwrite.
+        word (int): Instruction word to write to all positions.
+        fmt (str): Output format, 'hack' or 'bin'.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
 
+    """
+    binary = _encodeword(word, fmt, byteorder)
+    end = destfile.tell()
+    for position in positions:
+        destfile.seek(position * len(binary))
+        destfile.write(binary)
+    destfile.seek(end)
+
+
+def _dropwords(destfile, positions, width):
+    """ Removes already written words, moving later words down.
+
+        Words after the first removed one are rewritten once, in blocks,
+        and the file is truncated to its new length.
+
+    Args:
+        destfile (file): Output opened for reading and writing in binary
+            mode, positioned at its end.
+        positions (list of int): Zero-based indices of words to remove.
+        width (int): Size of a single word in output in bytes.
+
+    """
+    bounds = sorted(positions) + [destfile.tell() // width]
+    target = bounds[0] * width
+    for first, last in zip(bounds, bounds[1:]):
+        source = (first + 1) * width
+        remaining = (last - first - 1) * width
+        while remaining:
+            destfile.seek(source)
+            block = destfile.read(min(remaining, 2**20))
+            destfile.seek(target)
+            destfile.write(block)
+            source += len(block)
+            target += len(block)
+            remaining -= len(block)
+    destfile.truncate(target)
+    destfile.seek(target)
+
+
+def _addfixup(fixups, symbol, position, line_loc):
+    """ Records a reference to a symbol without an address yet.
+
+        References are kept per symbol in a pair of compact arrays, output
+        positions and line_locs, as variables are only resolved at the end.
+
+    """
+    refs = fixups.get(symbol)
+    if refs is None:
+        refs = fixups[symbol] = (array('L'), array('L'))
+    refs[0].append(position)
+    refs[1].append(line_loc)
+
+
+def _fixup(symbolics, symbol, line_locs, log):
+    """ Resolves forward references once their symbol is known.
+
+    Args:
+        symbolics (symboltable): Symbols of the assembled file.
+        symbol (str): Label just defined, or variable at end of input.
+        line_locs (array of int): line_loc per reference.
+        log (diagnostics): Collector of parse errors.
+
+    Returns:
+        word (int): Address of symbol, None when it overflows, in which
+            case every reference is reported.
+
+    """
+    word = None
+    for line_loc in line_locs:
+        try:
+            word = symbolics.address(symbol, line_loc)
+        except ParseError as err:
+            log.report(err)
+    return word
+
+
+def write(words, outfile, fmt='hack', byteorder='little'):
+    """ Writes instruction words to file in given output format.
+
+        'hack' writes one '016b' text line per word. 'bin' writes a ROM image
+        of packed 16-bit words, about 8x smaller, which can be loaded with
+        loadrom.
+
+    Args:
+        words (iterable of int): Instruction words.
+        outfile (str): Filepath to output.
+        fmt (str): Output format, 'hack' or 'bin'.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+
+    """
+    if fmt == 'bin':
+        rom = array('H', words)
+        if byteorder != sys.byteorder:
+            rom.byteswap()
+        with open(outfile, 'wb') as destfile:
+            rom.tofile(destfile)
+    else:
+        # Instruction words are only formatted to text when written
+        with open(outfile, 'w') as destfile:
+            destfile.writelines(format(word, '016b') + '\n' for word in words)
+
+
+def loadrom(romfile, byteorder='little'):
+    """ Loads a packed binary ROM image by memory-mapping it.
+
+        Words are read zero-copy from the mapped file when byteorder matches
+        the native byte order, otherwise they are copied and swapped.
+
+    Args:
+        romfile (str): Filepath to ROM written with fmt 'bin'.
+        byteorder (str): Byte order of ROM, 'little' or 'big'.
+
+    Returns:
+        words (memoryview or array of int): Unsigned 16-bit instruction words.
+
+    Raises:
+        InputError when the ROM is not a whole number of words, e.g. when
+            truncated.
+
+    """
+    import mmap
+    with open(romfile, 'rb') as srcfile:
+        size = os.fstat(srcfile.fileno()).st_size
+        if size % 2:
+            raise InputError(romfile, "Truncated ROM, {0} bytes is not a "
+                             "whole number of 16-bit words".format(size))
+        if size == 0:  # Can not map empty file
+            return array('H')
+        rom = mmap.mmap(srcfile.fileno(), 0, access=mmap.ACCESS_READ)
+    words = memoryview(rom).cast('H')
+    if byteorder != sys.byteorder:
+        words = array('H', words)
+        words.byteswap()
+    return words
+
+
+def stream(asmfile, outputdir=None, fmt='hack', byteorder='little',
+           log=None, cache=None):
+    """ Assembles asm in a single pass while reading lines lazily.
+
+        Instructions are written to output as soon as they are parsed.
+        References to labels not yet defined are written as placeholders and
+        kept in a fixup list, which is patched in place when the label is
+        defined. Symbols still unresolved at end of file are variables and
+        are allocated in order of first use, so output is byte-identical to
+        main() for asm with unique labels. Placeholders of references
+        overflowing 15 bits are reported and dropped from output at the
+        end, as main() drops failed instructions.
+
+        Memory use is proportional to the number of symbols and unresolved
+        references instead of the number of lines. Variables are only
+        resolved at end of file, so every reference to a variable is kept
+        until then, at 16 bytes each.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        outputdir (str): Optional filepath to output hack. If empty output is
+            placed in input directory.
+        fmt (str): Output format, 'hack' or 'bin'.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are logged to ./log.txt.
+        cache (encodecache): Optional encoding cache, by default a new one.
+
+    Returns:
+        written (int): Number of instruction words written.
+        failed (int): Number of instructions with failed parsing.
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+
+    """
+    own_log = log is None
+    if own_log:
+        log = diagnostics()
+    log.asmfile = asmfile
+    if cache is None:
+        cache = encodecache()
+    symbolics = symboltable([])
+    fixups = {}  # symbol: arrays of output positions and line_locs
+    dropped = array('L')  # Output positions of overflowed references
+    placeholder = _encodeword(0, fmt, byteorder)
+
+    c_idx = 0  # Instruction address, includes failed lines as in main
+    w_idx = 0  # Written words
+    failed = 0
+    try:
+        with open(asmfile) as srcfile, \
+                open(_outpath(asmfile, outputdir, fmt), 'w+b') as destfile:
+            for line in _sanitizestream(srcfile):
+                if _islabel(line):
+                    label = line[1:-1]
+                    symbolics.table[label] = c_idx
+                    if label in fixups:
+                        positions, line_locs = fixups.pop(label)
+                        word = _fixup(symbolics, label, line_locs, log)
+                        if word is None:
+                            failed += len(positions)
+                            dropped.extend(positions)
+                        else:
+                            _patchwords(destfile, positions, word, fmt,
+                                        byteorder)
+                    continue
+
+                c_idx += 1
+                symbol = line[1:]
+                if line[0] == '@' and symbol not in symbolics.table and \
+                        not symbol[:1].isdigit():  # Forward label or variable
+                    if not _isvalidsymbol(symbol):
+                        failed += 1
+                        log.report(ParseError(line, c_idx, itype='a-type'))
+                        continue
+                    _addfixup(fixups, symbol, w_idx, c_idx)
+                    destfile.write(placeholder)
+                    w_idx += 1
+                    continue
+
+                try:
+                    _, word = cache.encode(line, c_idx, symbolics)
+                except ParseError as err:
+                    failed += 1
+                    log.report(err)
+                    continue
+                destfile.write(_encodeword(word, fmt, byteorder))
+                w_idx += 1
+
+            # Leftover symbols were never defined as labels
+            for symbol, (positions, line_locs) in fixups.items():
+                word = _fixup(symbolics, symbol, line_locs, log)
+                if word is None:
+                    failed += len(positions)
+                    dropped.extend(positions)
+                else:
+                    _patchwords(destfile, positions, word, fmt, byteorder)
+            if dropped:
+                _dropwords(destfile, dropped, len(placeholder))
+                w_idx -= len(dropped)
+    finally:
+        if own_log:
+            log.write()
+
+    return w_idx, failed, symbolics
+
+
+def pipe(srcfile, destfile, fmt='hack', byteorder='little', log=None,
+         cache=None):
+    """ Assembles asm from a text stream to a binary stream in one pass.
+
+        As stream, but output can not be patched once written, e.g. when
+        reading stdin and writing stdout in a shell pipeline. Lines are read
+        as they arrive and instruction words are written as soon as they are
+        parsed, until the first reference to a symbol not yet defined. From
+        there words are held back until the symbol is defined as a label,
+        and then written up to the next unresolved reference. Symbols still
+        unresolved at end of input are variables, so words after the first
+        use of a variable are held until end of input. Held references
+        overflowing 15 bits are reported and left out, as in main().
+
+    Args:
+        srcfile (file object): asm text stream, e.g. sys.stdin.
+        destfile (file object): Binary output stream, e.g. sys.stdout.buffer.
+        fmt (str): Output format, 'hack' or 'bin'.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are logged to ./log.txt.
+        cache (encodecache): Optional encoding cache, by default a new one.
 
-def main(asmfile, outputdir=None):
-    """ Creates a symbolictable isntance and parseline instances.
+    Returns:
+        written (int): Number of instruction words written.
+        failed (int): Number of instructions with failed parsing.
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+
+    """
+    own_log = log is None
+    if own_log:
+        log = diagnostics()
+    log.asmfile = getattr(srcfile, 'name', None)
+    if cache is None:
+        cache = encodecache()
+    symbolics = symboltable([])
+    fixups = {}  # symbol: arrays of output positions and line_locs
+    held = []  # Words from first unresolved reference, None if pending
+    dropped = 0  # Overflowed references, held as -1
+    offset = 0  # Position of held[0] in output
+    start = 0  # held words before start are written
+
+    def release():
+        """ Writes held words up to the first pending reference. """
+        nonlocal offset, start
+        end = start
+        while end < len(held) and held[end] is not None:
+            end += 1
+        destfile.writelines(_encodeword(word, fmt, byteorder)
+                            for word in held[start:end] if word >= 0)
+        start = end
+        if start == len(held):
+            held.clear()
+            start = 0
+        elif start > len(held) // 2:  # Drop written words, amortized
+            del held[:start]
+            offset += start
+            start = 0
+
+    c_idx = 0  # Instruction address, includes failed lines as in main
+    w_idx = 0  # Output positions, including dropped references
+    failed = 0
+    try:
+        for line in srcfile:
+            line = _sanitizeline(line)
+            if not line:
+                continue
+            if _islabel(line):
+                label = line[1:-1]
+                symbolics.table[label] = c_idx
+                if label in fixups:
+                    positions, line_locs = fixups.pop(label)
+                    word = _fixup(symbolics, label, line_locs, log)
+                    if word is None:
+                        failed += len(positions)
+                        dropped += len(positions)
+                    for position in positions:
+                        held[position - offset] = -1 if word is None else word
+                    release()
+                continue
+
+            c_idx += 1
+            symbol = line[1:]
+            if line[0] == '@' and symbol not in symbolics.table and \
+                    not symbol[:1].isdigit():  # Forward label or variable
+                if not _isvalidsymbol(symbol):
+                    failed += 1
+                    log.report(ParseError(line, c_idx, itype='a-type'))
+                    continue
+                if not held:
+                    offset = w_idx
+                _addfixup(fixups, symbol, w_idx, c_idx)
+                held.append(None)
+                w_idx += 1
+                continue
+
+            try:
+                _, word = cache.encode(line, c_idx, symbolics)
+            except ParseError as err:
+                failed += 1
+                log.report(err)
+                continue
+            if held:
+                held.append(word)
+            else:
+                destfile.write(_encodeword(word, fmt, byteorder))
+            w_idx += 1
+
+        # Leftover symbols were never defined as labels
+        for symbol, (positions, line_locs) in fixups.items():
+            word = _fixup(symbolics, symbol, line_locs, log)
+            if word is None:
+                failed += len(positions)
+                dropped += len(positions)
+            for position in positions:
+                held[position - offset] = -1 if word is None else word
+        release()
+        destfile.flush()
+    finally:
+        if own_log:
+            log.write()
+
+    return w_idx - dropped, failed, symbolics
+
+
+def main(asmfile, outputdir=None, fmt='hack', byteorder='little', log=None,
+         cache=None, timer=None):
+    """ Creates a symbolictable isntance and parses all instructions.
 
         Holds asm in memory while reading and hack while writing.
-        All parseline objects along with symbolic table are retained and
-        returned for ease of error handling. To avoid (possibly) large memory
-        footprint function can be written inside loop to facilitate garbage
-        collection and parseline instances discarded, but symboltable needs
-        to be adjusted to disgard sanitized lines.
+        Parsed instructions are kept in a compact assembled container and
+        returned with the symbolic table for ease of error handling, each
+        parseline instance is discarded once parsed. For asm too large to
+        hold in memory use stream.
 
         parseline instances do not require strong sanitization.
 
@@ -301,62 +1516,786 @@ def main(asmfile, outputdir=None):
         asmfile (str): Filepath to input asm.
         outputdir (str): Optional filepath to output hack. If empty output is
             placed in input directory.
+        fmt (str): Output format, 'hack' text or 'bin' packed ROM image.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are logged to ./log.txt.
+        cache (encodecache): Optional encoding cache, by default a new one.
+        timer (phasetimer): Optional timer of the read, sanitize, inittable,
+            parse and write phases.
 
     Returns:
-        parsed (list of parseline): Instances of parsed instruction lines
+        parsed (assembled): Parsed instructions, indexable as instruction
+            views with the attributes of parseline
         symbolics (symbolictable): Filled instance of the instruction symbolics
 
         """
-    lines = [line.strip() for line in open(asmfile)]
-    symbolics = symboltable(lines)
+    phase = _untimed if timer is None else timer.phase
+    with phase('read'), open(asmfile) as srcfile:
+        text = srcfile.read()
+    with phase('sanitize'):
+        lines = _sanitizebuffer(text)
+        del text
+    with phase('inittable'):
+        symbolics = symboltable(lines, sanitized=True)
+
+    own_log = log is None
+    if own_log:
+        log = diagnostics()
+    log.asmfile = asmfile
+
+    try:
+        with phase('parse'):
+            parsed = _encodelines(symbolics, log, cache)
+    finally:
+        if own_log:
+            log.write()
+
+    with phase('write'):
+        write(parsed.words, _outpath(asmfile, outputdir, fmt), fmt, byteorder)
 
-    line_loc = 0
-    parsed = []
-    for line in symbolics.lines:
-        line_loc += 1
+    # Returns for error handling
+    return parsed, symbolics
+
+
+def _encodelines(symbolics, log, cache=None):
+    """ Encodes sanitized instruction lines of a filled symboltable.
+
+    Args:
+        symbolics (symboltable): Symbolic table holding instruction lines.
+        log (diagnostics): Collector of parse errors.
+        cache (encodecache): Optional encoding cache, by default a new one.
+
+    Returns:
+        parsed (assembled): Parsed instructions.
+
+    """
+    if cache is None:
+        cache = encodecache()
+    parsed = assembled(symbolics.lines)
+    for line_loc, line in enumerate(symbolics.lines, 1):
         try:
-            parsed.append(parseline(line, line_loc, symbolics))
+            itype, word = cache.encode(line, line_loc, symbolics)
+            parsed.append(word, itype, line_loc)
         except ParseError as err:
-            print("{2} Error parsing {0}: {1}".format(err.line_loc, err.line,
-                                                      err.type))
+            log.report(err)
+    return parsed
 
-    if outputdir is None:  # Use asm filepath to create hackfile
-        hackfile = re.sub(r'(asm)$', 'hack', asmfile)
-    else:
-        hackfile = outputdir + os.path.splitext(os.path.split(asmfile)[1])[0]\
-            + '.hack'
 
-    with open(hackfile, 'w') as destfile:
-        for line in parsed:
-            print(line.binary, file=destfile)
+def _encodebytes(sane, log):
+    """ Encodes sanitized asm bytes, tokenizing without decoding.
+
+    Args:
+        sane (bytes): asm with comments and whitespace removed, lines
+            separated by newlines.
+        log (diagnostics): Collector of parse errors.
+
+    Returns:
+        parsed (assembled): Parsed instructions, with lines kept as bytes.
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+
+    """
+    symbolics = symboltable([], sanitized=True)
+    lines = symbolics.lines
+    for line in sane.split(b'\n'):
+        if not line:
+            continue
+        if line.startswith(b'(') and line.endswith(b')'):
+            label = line[1:-1].decode()
+            if _isvalidsymbol(label):
+                symbolics.table[sys.intern(label)] = len(lines)
+                continue
+        lines.append(line)
+
+    addresses = {}  # symbol bytes: address, decodes each symbol once
+    parsed = assembled(lines)
+    for line_loc, line in enumerate(lines, 1):
+        word = _C_TABLE_BYTES.get(line)
+        itype = 'c_type'
+        try:
+            if word is None and line.startswith(b'@'):
+                itype = 'a_type'
+                symbol = line[1:]
+                word = addresses.get(symbol)
+                if word is None and symbol[:1].isdigit():
+                    if not symbol.isdigit():
+                        raise ParseError(line.decode(), line_loc,
+                                         itype='a-type')
+                    word = int(symbol)
+                    if word > _ADDRESS_MAX:
+                        raise ParseError(line.decode(), line_loc,
+                                         itype='Overflow')
+                    addresses[symbol] = word
+                elif word is None:
+                    label = sys.intern(symbol.decode())
+                    if label not in symbolics.table and \
+                            not _isvalidsymbol(label):
+                        raise ParseError(line.decode(), line_loc,
+                                         itype='a-type')
+                    word = symbolics.address(label, line_loc)
+                    addresses[symbol] = word
+            elif word is None:  # Fallback parse, reports errors
+                parsedline = parseline(line.decode(), line_loc,
+                                       symbolics, sanitized=True)
+                word, itype = parsedline.binary, parsedline.type
+            parsed.append(word, itype, line_loc)
+        except ParseError as err:
+            log.report(err)
+    return parsed, symbolics
+
+
+def mapped(asmfile, outputdir=None, fmt='hack', byteorder='little', log=None,
+           timer=None):
+    """ Assembles memory-mapped asm, tokenizing directly on bytes.
+
+        The asm-file is mapped and sanitized as bytes, letting the OS page
+        input in lazily and skipping decoding of the whole file. C-
+        instructions and numeric addresses are encoded from bytes, only
+        labels and distinct symbols are decoded and interned to the symbol
+        table, and failing lines for error reporting. Whitespace is ASCII
+        whitespace and lines end with a newline.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        outputdir (str): Optional filepath to output hack. If empty output is
+            placed in input directory.
+        fmt (str): Output format, 'hack' text or 'bin' packed ROM image.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are logged to ./log.txt.
+        timer (phasetimer): Optional timer of the sanitize, parse and write
+            phases, reading is part of sanitizing the mapped file.
+
+    Returns:
+        parsed (assembled): Parsed instructions as in main, with lines kept
+            as bytes and decoded by instruction views
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+
+    """
+    import mmap
+    phase = _untimed if timer is None else timer.phase
+    with phase('sanitize'), open(asmfile, 'rb') as srcfile:
+        if os.fstat(srcfile.fileno()).st_size == 0:  # Can not map empty file
+            sane = b''
+        else:
+            with mmap.mmap(srcfile.fileno(), 0,
+                           access=mmap.ACCESS_READ) as source:
+                sane = _RE_SANITIZE_BYTES.sub(b'', source)
+
+    own_log = log is None
+    if own_log:
+        log = diagnostics()
+    log.asmfile = asmfile
+
+    try:
+        with phase('parse'):
+            parsed, symbolics = _encodebytes(sane, log)
+    finally:
+        if own_log:
+            log.write()
+
+    with phase('write'):
+        write(parsed.words, _outpath(asmfile, outputdir, fmt), fmt, byteorder)
 
     # Returns for error handling
     return parsed, symbolics
 
 
+def assemble_lines(lines, log=None, container='array', cache=None):
+    """ Assembles asm lines in memory, without any file I/O.
+
+        Lets test harnesses and emulators assemble in-process, e.g.
+        assemble_lines(['@2', 'D=A', '@0', 'M=D'])[0].
+
+    Args:
+        lines (iterable of str): asm lines, with or without line ends.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are collected silently and not written to a log-file.
+        container (str): Type of returned words, 'array' or 'numpy'.
+        cache (encodecache): Optional encoding cache, by default a new one.
+
+    Returns:
+        words (array or numpy.ndarray): Instruction words as array('H') or
+            NumPy uint16 array.
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+        log (diagnostics): Collected parse errors.
+
+    Raises:
+        ParseError or LimitError when log is set to abort assembly.
+
+    """
+    if log is None:
+        log = diagnostics(path=None, echo=False)
+    symbolics = symboltable(_sanitizebuffer('\n'.join(lines)), sanitized=True)
+    parsed = _encodelines(symbolics, log, cache)
+    return _container(parsed.words, container), symbolics, log
+
+
+def assemble_bytes(buffer, log=None, container='array'):
+    """ Assembles an asm bytes buffer in memory, without any file I/O.
+
+        Tokenizes on bytes as mapped, so any bytes-like object such as
+        bytes, bytearray or an mmap is accepted without decoding.
+
+    Args:
+        buffer (bytes-like): asm text with lines separated by newlines.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are collected silently and not written to a log-file.
+        container (str): Type of returned words, 'array' or 'numpy'.
+
+    Returns:
+        words (array or numpy.ndarray): Instruction words as array('H') or
+            NumPy uint16 array.
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+        log (diagnostics): Collected parse errors.
+
+    Raises:
+        ParseError or LimitError when log is set to abort assembly.
+
+    """
+    if log is None:
+        log = diagnostics(path=None, echo=False)
+    parsed, symbolics = _encodebytes(_RE_SANITIZE_BYTES.sub(b'', buffer), log)
+    return _container(parsed.words, container), symbolics, log
+
+
+def _container(words, container):
+    """ Returns words as array('H') or as a NumPy uint16 view of it.
+
+        NumPy is optional and only imported when asked for.
+
+    """
+    if container == 'array':
+        return words
+    elif container == 'numpy':
+        import numpy
+        return numpy.frombuffer(words, dtype=numpy.uint16)
+    raise ValueError("Unknown container '{0}'".format(container))
+
+
+def _chunkbounds(asmfile, chunks):
+    """ Splits asm-file to byte ranges of roughly equal size on line ends.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        chunks (int): Number of chunks to split to.
+
+    Returns:
+        bounds (list of tuple): Non-empty (start, end) byte ranges in order.
+
+    """
+    size = os.path.getsize(asmfile)
+    offsets = [0]
+    with open(asmfile, 'rb') as srcfile:
+        for i in range(1, chunks):
+            srcfile.seek(max(size * i // chunks, offsets[-1]))
+            srcfile.readline()  # Move to start of next line
+            offsets.append(min(srcfile.tell(), size))
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets, offsets[1:])
+            if start < end]
+
+
+def _readchunk(asmfile, start, end):
+    """ Yields fully sanitized lines of asm-file within byte range.
+
+        Bytes are decoded as open() would decode the whole file.
+
+    """
+    import io
+    with open(asmfile, 'rb') as srcfile:
+        srcfile.seek(start)
+        data = srcfile.read(end - start)
+    yield from _sanitizebuffer(io.TextIOWrapper(io.BytesIO(data)).read())
+
+
+def _scanchunk(job):
+    """ Label pass over a chunk of asm-file, run in a worker process.
+
+    Args:
+        job (tuple): asmfile with start and end of the chunk byte range.
+
+    Returns:
+        count (int): Number of instructions in chunk.
+        labels (dict of str: int): Labels with addresses local to chunk.
+        refs (list of str): Symbolic A-instruction references, without
+            duplicates in order of first use.
+
+    """
+    asmfile, start, end = job
+    count = 0
+    labels = {}
+    refs = {}
+    for line in _readchunk(asmfile, start, end):
+        if _islabel(line):
+            labels[line[1:-1]] = count
+            continue
+        count += 1
+        if line[0] == '@' and line[1:] not in refs and \
+                not line[1:2].isdigit():
+            refs[line[1:]] = None
+    return count, labels, list(refs)
+
+
+def _encodechunk(job):
+    """ Encode pass over a chunk of asm-file, run in a worker process.
+
+    Args:
+        job (tuple): asmfile, start and end of the chunk byte range, global
+            address of first instruction in chunk and complete symbol table.
+
+    Returns:
+        words (list of int): Instruction words of successfully parsed lines.
+        errors (list of ParseError): Failed parses, reported by parent.
+
+    """
+    asmfile, start, end, base, table = job
+    symbolics = symboltable([])
+    symbolics.table = table
+
+    cache = encodecache()
+    line_loc = base
+    words = []
+    errors = []
+    for line in _readchunk(asmfile, start, end):
+        if _islabel(line):
+            continue
+        line_loc += 1
+        try:
+            words.append(cache.encode(line, line_loc, symbolics)[1])
+        except ParseError as err:
+            errors.append(err)
+    return words, errors
+
+
+def parallel(asmfile, outputdir=None, jobs=0, fmt='hack', byteorder='little',
+             chunks=None, log=None):
+    """ Assembles a single large asm-file in chunks over a process pool.
+
+        Chunks are first scanned in parallel for instruction counts, local
+        labels and symbolic references. A prefix sum over the counts gives
+        global label addresses, and variables are allocated by walking the
+        references in chunk order, so addresses match main() exactly. The
+        encode pass then runs per chunk with the complete table and results
+        are joined in order.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        outputdir (str): Optional filepath to output hack. If empty output is
+            placed in input directory.
+        jobs (int): Number of worker processes, 0 uses all cores.
+        fmt (str): Output format, 'hack' or 'bin'.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        chunks (int): Optional number of chunks, by default four per worker.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are logged to ./log.txt. Errors of workers are reported
+            in order once all chunks are encoded.
+
+    Returns:
+        written (int): Number of instruction words written.
+        failed (int): Number of instructions with failed parsing.
+        symbolics (symbolictable): Filled instance of the instruction symbolics
+
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    workers = jobs or os.cpu_count()
+    bounds = _chunkbounds(asmfile, chunks or workers * 4)
+    symbolics = symboltable([])
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scans = list(pool.map(_scanchunk, [(asmfile, start, end)
+                                           for start, end in bounds]))
+
+        bases = []
+        base = 0
+        for count, labels, _ in scans:
+            bases.append(base)
+            for label, address in labels.items():
+                symbolics.table[label] = base + address
+            base += count
+        for _, _, refs in scans:  # Variables in order of first use
+            for ref in refs:
+                if ref in symbolics.table or _isvalidsymbol(ref):
+                    symbolics.resolve(ref)
+
+        encoded = list(pool.map(_encodechunk, [
+            (asmfile, start, end, base, symbolics.table)
+            for (start, end), base in zip(bounds, bases)]))
+
+    own_log = log is None
+    if own_log:
+        log = diagnostics()
+    log.asmfile = asmfile
+    failed = 0
+    try:
+        for _, errors in encoded:
+            for err in errors:
+                failed += 1
+                log.report(err)
+    finally:
+        if own_log:
+            log.write()
+
+    words = [word for chunk_words, _ in encoded for word in chunk_words]
+    write(words, _outpath(asmfile, outputdir, fmt), fmt, byteorder)
+    return len(words), failed, symbolics
+
+
+def _collectasm(paths):
+    """ Expands files, directories and glob patterns to asm filepaths.
+
+        Directories contribute the asm-files directly under them. Patterns
+        are expanded here as well, since not every shell does it.
+
+    Args:
+        paths (list of str): Filepaths, directories or glob patterns.
+
+    Returns:
+        asmfiles (list of str): asm filepaths in given order, without
+            duplicates.
+
+    Raises:
+        InputError when a given file is not an asm-file or a pattern has no
+            matches.
+
+    """
+    asmfiles = []
+    for path in paths:
+        if os.path.isdir(path):
+            import glob
+            asmfiles.extend(sorted(glob.glob(os.path.join(path, '*.asm'))))
+        elif _RE_GLOB_MAGIC.search(path):
+            import glob
+            matches = [match for match in sorted(glob.glob(path))
+                       if os.path.splitext(match)[1] == '.asm']
+            if not matches:
+                raise InputError(path, "No asm-files match")
+            asmfiles.extend(matches)
+        elif os.path.splitext(path)[1] != '.asm':
+            raise InputError(path, "Not an asm-file")
+        else:
+            asmfiles.append(path)
+    return list(dict.fromkeys(asmfiles))
+
+
+def _assemblejob(job):
+    """ Assembles a single asm-file in batch mode.
+
+        Failures are returned instead of raised, so one broken file does not
+        stop the rest of a batch.
+
+        With a cache directory output of unchanged asm is fetched from the
+        build cache, and output of asm assembled without errors is stored.
+
+    Args:
+        job (tuple): asmfile, outputdir, mode, fmt, byteorder, jobs and
+            cachedir as passed to batch, followed by max_errors, fail_fast
+            and echo of the batch diagnostics.
+
+    Returns:
+        result (jobresult): Written instructions, parse errors as collected
+            by diagnostics, elapsed seconds, error message or None, build
+            cache hit and encoding cache hits and misses of the file.
+
+    """
+    asmfile, outputdir, mode, fmt, byteorder, jobs, cachedir, max_errors, \
+        fail_fast, echo = job
+    log = diagnostics(None, max_errors=max_errors, fail_fast=fail_fast,
+                      echo=echo)
+    context = assemblercontext(fmt, byteorder, log)
+    start = time.perf_counter()
+
+    def result(written, error=None, cached=False):
+        return jobresult(asmfile, written, log.errors,
+                         time.perf_counter() - start, error, cached,
+                         context.cache.hits, context.cache.misses)
+
+    try:
+        if cachedir is not None:
+            from buildcache import buildcache
+            cache = buildcache(cachedir, version=__version__)
+            outfile = _outpath(asmfile, outputdir, fmt)
+            key = cache.key(asmfile, fmt, byteorder, os.linesep)
+            if cache.fetch(key, outfile):
+                width = len(_encodeword(0, fmt, byteorder))
+                return result(os.path.getsize(outfile) // width, cached=True)
+
+        if mode == 'stream':
+            written, _ = context.stream(asmfile, outputdir)
+        elif mode == 'chunked':
+            written, _, _ = parallel(asmfile, outputdir, jobs, fmt, byteorder,
+                                     log=log)
+        elif mode == 'mmap':
+            written = len(context.mapped(asmfile, outputdir))
+        else:
+            written = len(context.main(asmfile, outputdir))
+
+        if cachedir is not None and not log.errors:
+            cache.store(key, outfile)
+    except (ParseError, LimitError) as err:
+        return result(0, str(err))
+    except Exception as err:
+        return result(0, repr(err))
+    return result(written)
+
+
+def batch(asmfiles, outputdir=None, jobs=1, mode='main', fmt='hack',
+          byteorder='little', cachedir=None, cachesize=256 * 2**20, log=None):
+    """ Assembles many asm-files, optionally spread over a process pool.
+
+        With more than one job files are handed to worker processes in
+        chunks, so interpreter startup and table construction are paid once
+        per worker instead of once per file. In 'chunked' mode files are
+        assembled one at a time, each split over the jobs.
+
+        With a cache directory unchanged asm-files are served from the build
+        cache, which is trimmed to cachesize once the batch is done.
+
+        Parse errors of all files are gathered in log in input order. Its
+        max_errors and fail_fast limits apply per file.
+
+    Args:
+        asmfiles (list of str): Filepaths to input asm.
+        outputdir (str): Optional filepath to output. If empty output is
+            placed in input directories.
+        jobs (int): Number of worker processes, 0 uses all cores and 1
+            assembles in the current process.
+        mode (str): Assemble with 'main', 'stream', 'chunked' parallel or
+            'mmap' mapped.
+        fmt (str): Output format, 'hack' or 'bin'.
+        byteorder (str): Byte order of 'bin' format, 'little' or 'big'.
+        cachedir (str): Optional build cache directory.
+        cachesize (int): Size limit of build cache in bytes.
+        log (diagnostics): Optional collector of parse errors, by default
+            errors are logged to ./log.txt.
+
+    Returns:
+        results (list of jobresult): Result of _assemblejob per file, in
+            input order.
+
+    """
+    own_log = log is None
+    if own_log:
+        log = diagnostics()
+    batchjobs = [(asmfile, outputdir, mode, fmt, byteorder, jobs, cachedir,
+                  log.max_errors, log.fail_fast, log.echo)
+                 for asmfile in asmfiles]
+    if jobs == 1 or len(batchjobs) < 2 or mode == 'chunked':
+        results = [_assemblejob(job) for job in batchjobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        workers = jobs or os.cpu_count()
+        chunksize = max(1, len(batchjobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_assemblejob, batchjobs,
+                                    chunksize=chunksize))
+
+    for result in results:
+        log.extend(result.errors)
+    if own_log:
+        log.write()
+
+    if cachedir is not None:
+        from buildcache import buildcache
+        buildcache(cachedir, cachesize).evict()
+    return results
+
+
+def _printsummary(results, elapsed, cachedir=None):
+    """ Prints failed files and aggregate counts and timings of a batch. """
+    for result in results:
+        if result.error is not None:
+            print("Failed {0}: {1}".format(result.asmfile, result.error))
+        elif result.errors:
+            print("{0}: {1} instructions failed parsing".format(
+                result.asmfile, len(result.errors)))
+    files_failed = sum(1 for result in results if result.error is not None)
+    print("Assembled {0} files, {1} failed: {2} instructions, {3} parse "
+          "errors".format(len(results) - files_failed, files_failed,
+                          sum(result.written for result in results),
+                          sum(len(result.errors) for result in results)))
+    if cachedir is not None:
+        hits = sum(1 for result in results if result.cached)
+        print("Build cache: {0} hits, {1} misses".format(
+            hits, len(results) - hits))
+    hits = sum(result.hits for result in results)
+    lookups = hits + sum(result.misses for result in results)
+    if lookups:
+        print("Encoding cache: {0:.1%} hit rate, {1} of {2} lookups".format(
+            hits / lookups, hits, lookups))
+    if not results:  # Directories or patterns without asm-files
+        print("Elapsed {0:.3f} s".format(elapsed))
+        return
+    print("Elapsed {0:.3f} s, {1:.3f} s assembling, slowest {2}".format(
+        elapsed, sum(result.seconds for result in results),
+        max(results, key=lambda result: result.seconds).asmfile))
+
+
 if __name__ == "__main__":
     # Utility config
     # Called from commandline with optional destination path:
     #    'python assembler.py "path-to.asm" -d "path-to.hack"'
+    # or with many files, directories or patterns in parallel:
+    #    'python assembler.py "asm-dir" "other/*.asm" -d "out" -j 0'
+    # or as a filter from stdin to stdout:
+    #    'generator | python assembler.py - | emulator'
+    import argparse
     parser = argparse.ArgumentParser(description='Parse a hack assembly file '
                                      'to machine code.')
-    parser.add_argument('filepath', type=str, help='path to source asm')
+    parser.add_argument('filepath', type=str, nargs='+',
+                        help='path to source asm, directory or glob '
+                        'pattern, or - to assemble stdin to stdout')
     parser.add_argument('--destination', '-d', type=str, default=None,
                         metavar='OUTPUTDIR',
                         help='output directory, by default uses asm path')
+    parser.add_argument('--stream', '-s', action='store_true',
+                        help='single pass assembly reading input lazily, '
+                        'for asm too large to hold in memory')
+    parser.add_argument('--chunked', '-c', action='store_true',
+                        help='split each asm over --jobs worker processes, '
+                        'for single very large files')
+    parser.add_argument('--mmap', '-m', action='store_true',
+                        help='memory-map input and tokenize on bytes, for '
+                        'large generated asm')
+    parser.add_argument('--format', '-f', type=str, default='hack',
+                        choices=['hack', 'bin'], dest='fmt',
+                        help='hack text or packed 16-bit binary ROM output')
+    parser.add_argument('--byteorder', type=str, default='little',
+                        choices=['little', 'big'],
+                        help='byte order of binary ROM words')
+    parser.add_argument('--cache', type=str, default=None, metavar='CACHEDIR',
+                        help='build cache directory, unchanged asm-files '
+                        'are not reassembled')
+    parser.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                        help='build cache size limit in megabytes')
+    parser.add_argument('--log', type=str, default=None,
+                        metavar='LOGFILE', help='log-file of parse errors, '
+                        'by default ./log.txt and none when reading stdin')
+    parser.add_argument('--log-format', type=str, default='text',
+                        choices=['text', 'jsonl'],
+                        help='log-file as text or JSON lines')
+    parser.add_argument('--max-errors', type=int, default=None, metavar='N',
+                        help='abort assembly of a file after N parse errors')
+    parser.add_argument('--fail-fast', action='store_true',
+                        help='abort assembly of a file on first parse error')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='worker processes for many files or chunks, 0 '
+                        'uses all cores')
+    parser.add_argument('--timings', action='store_true',
+                        help='print wall time and peak memory per phase of '
+                        'a single asm-file in default or --mmap mode, '
+                        'memory is traced in a second pass, and the '
+                        'encoding cache hit rate in default mode')
+    parser.add_argument('--profile', type=str, default=None,
+                        metavar='PROFFILE',
+                        help='run under cProfile and dump stats to PROFFILE, '
+                        'worker processes are not profiled')
     args = parser.parse_args()
 
-    if os.path.splitext(args.filepath)[1] != '.asm':
-        raise InputError(args.filepath, "Not an asm-file")
+    piped = args.filepath == ['-']
+    if '-' in args.filepath and not piped:
+        parser.error('- reads stdin and can not be combined with other paths')
+    if piped and (args.destination or args.chunked or args.mmap or
+                  args.cache is not None):
+        parser.error('- reads stdin and writes stdout, it can not be used '
+                     'with --destination, --chunked, --mmap or --cache')
+    asmfiles = ['-'] if piped else _collectasm(args.filepath)
+    # Directories and patterns get the batch summary and exit status, even
+    # when they expand to a single asm-file
+    single = piped or len(args.filepath) == 1 and not (
+        os.path.isdir(args.filepath[0]) or
+        _RE_GLOB_MAGIC.search(args.filepath[0]))
 
     if args.destination:
-        if args.destination[-1:] != '\\':
-            destdir = args.destination + '\\'
+        if args.destination[-1:] not in ('\\', '/'):
+            destdir = args.destination + os.sep
         else:
             destdir = args.destination
     else:
         destdir = args.destination
 
+    if args.log is None and not piped:
+        args.log = './log.txt'
+    log = diagnostics(args.log, args.log_format, args.max_errors,
+                      args.fail_fast)
+
     # Main function calls
-    main(args.filepath, destdir)
-    print('Assembly complete!')
+    mode = 'pipe' if piped else 'chunked' if args.chunked else \
+        'stream' if args.stream else 'mmap' if args.mmap else 'main'
+    timer = None
+    if args.timings:
+        if not single or args.cache is not None or \
+                mode not in ('main', 'mmap'):
+            parser.error('--timings requires a single asm-file path in '
+                         'default or --mmap mode without --cache')
+        timer = phasetimer(memory=False)  # Tracing would skew times
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if single and args.cache is None:
+        cache = encodecache()
+        try:
+            if mode == 'pipe':
+                log.echofile = sys.stderr  # stdout carries machine code
+                pipe(sys.stdin, sys.stdout.buffer, args.fmt, args.byteorder,
+                     log)
+            elif mode == 'stream':
+                stream(asmfiles[0], destdir, args.fmt, args.byteorder, log)
+            elif mode == 'chunked':
+                parallel(asmfiles[0], destdir, args.jobs, args.fmt,
+                         args.byteorder, log=log)
+            elif mode == 'mmap':
+                mapped(asmfiles[0], destdir, args.fmt, args.byteorder, log,
+                       timer)
+            else:
+                main(asmfiles[0], destdir, args.fmt, args.byteorder, log,
+                     cache, timer)
+        except (ParseError, LimitError) as err:
+            sys.exit('Assembly aborted: {0}'.format(err))
+        except BrokenPipeError:  # Reader of stdout exited early
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        finally:
+            log.write()
+            if args.profile is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+        if timer is not None:
+            # Peak memory of each phase from a second, traced pass
+            import tempfile
+            tracer = phasetimer()
+            with tempfile.TemporaryDirectory() as tmpdir:
+                assemble = mapped if mode == 'mmap' else main
+                try:
+                    assemble(asmfiles[0], tmpdir + os.sep, args.fmt,
+                             args.byteorder, diagnostics(None, echo=False),
+                             timer=tracer)
+                finally:
+                    tracer.stop()
+            peaks = [peak for _, _, peak in tracer.phases]
+            timer.phases = [(name, seconds, peak) for (name, seconds, _), peak
+                            in zip(timer.phases, peaks)]
+            print(timer.report())
+            if mode == 'main':  # mapped encodes bytes without the cache
+                print('Encoding cache: {0:.1%} hit rate, {1} of {2} '
+                      'lookups'.format(cache.hitrate(), cache.hits,
+                                       cache.hits + cache.misses))
+        if mode != 'pipe':
+            print('Assembly complete!')
+        elif log.errors:  # Let the pipeline see failed instructions
+            sys.exit(1)
+    else:
+        start = time.perf_counter()
+        results = batch(asmfiles, destdir, args.jobs, mode, args.fmt,
+                        args.byteorder, args.cache, args.cache_size * 2**20,
+                        log)
+        log.write()
+        if args.profile is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        _printsummary(results, time.perf_counter() - start, args.cache)
+        if any(result.error is not None or result.errors
+               for result in results):
+            sys.exit(1)
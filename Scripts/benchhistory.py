@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import namedtuple
+
+# Outcome of comparing one measurement with its baseline
+comparison = namedtuple('comparison', ['case', 'value', 'baseline', 'ratio',
+                                       'regressed'])
+
+# Environment fields that must match for runs to be comparable
+_ENVIRONMENT_KEYS = ('python', 'implementation', 'platform', 'machine',
+                     'cpus')
+
+# Measurements where larger values are worse
+_METRICS = ('seconds', 'peak_bytes')
+
+
+class benchhistory(object):
+    """ JSON store of benchmark runs with regression detection.
+
+    Every run keeps its time, git commit, environment and measurements per
+    case. A new run is compared with a rolling baseline of the last window
+    runs on the same environment. A case regresses when it is slower than
+    the baseline median by more than tolerance and also more than sigma
+    standard deviations above the baseline mean, so ordinary noise does not
+    fail a run. Cases with fewer than three baseline runs never regress.
+
+    Attributes:
+        path (str): Filepath of the JSON store.
+        runs (list of dict): Recorded runs, oldest first.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as histfile:
+                self.runs = json.load(histfile)['runs']
+        except FileNotFoundError:
+            self.runs = []
+
+    def record(self, report):
+        """ Adds benchmark report as a new run, see benchmark.py --json.
+
+        Args:
+            report (dict): Environment and results lists of a benchmark run.
+
+        Returns:
+            run (dict): The recorded run.
+
+        """
+        measurements = {}
+        for result in report.get('results', []) + \
+                report.get('synthetic', []):
+            for metric in _METRICS:
+                if metric in result:
+                    measurements['{0} {1}'.format(result['name'], metric)] = \
+                        result[metric]
+        run = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'commit': _commit(), 'environment': report['environment'],
+               'measurements': measurements}
+        self.runs.append(run)
+        return run
+
+    def save(self):
+        """ Writes all runs, replacing the store at once. """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, tmpfile = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as histfile:
+            json.dump({'runs': self.runs}, histfile, indent=1)
+        os.replace(tmpfile, self.path)
+
+    def compare(self, run, window=10, tolerance=0.1, sigma=3.0):
+        """ Compares run with the runs recorded before it.
+
+        Args:
+            run (dict): Recorded run to check.
+            window (int): Number of earlier comparable runs in baseline.
+            tolerance (float): Allowed slowdown over baseline median.
+            sigma (float): Allowed standard deviations over baseline mean.
+
+        Returns:
+            comparisons (list of comparison): Per case with a baseline,
+                worst ratio first.
+
+        """
+        env = {key: run['environment'].get(key) for key in _ENVIRONMENT_KEYS}
+        earlier = [other for other in self.runs[:self.runs.index(run)]
+                   if {key: other['environment'].get(key)
+                       for key in _ENVIRONMENT_KEYS} == env]
+
+        comparisons = []
+        for case, value in run['measurements'].items():
+            base = [other['measurements'][case] for other in earlier
+                    if case in other['measurements']][-window:]
+            if not base:
+                continue
+            median = statistics.median(base)
+            ratio = value / median if median else 1.0
+            regressed = len(base) >= 3 and ratio > 1 + tolerance and \
+                value > statistics.mean(base) + sigma * statistics.stdev(base)
+            comparisons.append(comparison(case, value, median, ratio,
+                                          regressed))
+        return sorted(comparisons, key=lambda comp: -comp.ratio)
+
+
+def _commit():
+    """ Returns short git commit of the working tree, None outside git. """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+import assembler
+from benchhistory import benchhistory
+
+
+def bench(asmfile, repeat=5, number=1):
+    """ Times full assembly of a single asm-file with assembler.main.
+
+        Output is written to a temporary directory, so the test corpus is
+        left untouched. Best of repeats is reported to filter out noise.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        repeat (int): Number of timing repeats.
+        number (int): Number of main calls per repeat.
+
+    Returns:
+        best (float): Fastest time of a single main call in seconds.
+        lines (int): Number of lines in the input file.
+
+    """
+    with open(asmfile) as srcfile:
+        lines = sum(1 for _ in srcfile)
+
+    log = assembler.diagnostics(path=None, echo=False)
+    with tempfile.TemporaryDirectory() as outputdir:
+        outputdir += os.sep
+        times = timeit.repeat(lambda: assembler.main(asmfile, outputdir,
+                                                     log=log),
+                              repeat=repeat, number=number)
+    return min(times) / number, lines
+
+
+def bench_memory(asmfile):
+    """ Measures peak traced memory of a single assembler.main call.
+
+        Run separately from timing, since tracemalloc slows assembly down.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+
+    Returns:
+        peak (int): Peak traced memory in bytes.
+
+    """
+    with tempfile.TemporaryDirectory() as outputdir:
+        tracemalloc.start()
+        try:
+            assembler.main(asmfile, outputdir + os.sep,
+                           log=assembler.diagnostics(path=None, echo=False))
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+def synthesize(asmfile, lines, label_density=0.05, variables=100,
+               comment_ratio=0.2, seed=1):
+    """ Writes a synthetic asm-file resembling generated VM translations.
+
+        Lines are drawn from common C-instructions, constants, label and
+        variable references, so the file assembles without errors. Jumps
+        refer to earlier labels within the 32K instruction ROM, as labels
+        past it would not fit in an A-instruction.
+
+    Args:
+        asmfile (str): Filepath to output asm.
+        lines (int): Number of lines, including labels and comments.
+        label_density (float): Share of lines defining a label.
+        variables (int): Number of distinct variables referenced.
+        comment_ratio (float): Share of comment lines, half of the remaining
+            instructions also get a trailing comment at this ratio.
+        seed (int): Seed of the generator, same arguments give same file.
+
+    """
+    rand = random.Random(seed)
+    ccodes = ['D=M', 'D=A', 'M=D', 'A=M', 'AM=M-1', 'M=M+1', 'D=D+M',
+              'D=D-M', 'M=-1', 'M=0', 'D;JEQ', '0;JMP', 'D;JGT', 'A=A-1']
+    defined = 1  # Labels defined so far
+    reachable = 1  # Labels defined at addresses within ROM
+    address = 0
+    with open(asmfile, 'w') as destfile:
+        destfile.write('(L0)\n')
+        for _ in range(lines - 1):
+            roll = rand.random()
+            if roll < comment_ratio:
+                line = '// generated comment {0}'.format(rand.random())
+            elif roll < comment_ratio + label_density:
+                line = '(L{0})'.format(defined)
+                defined += 1
+                if address <= 32767:
+                    reachable = defined
+            else:
+                address += 1
+                kind = rand.random()
+                if kind < 0.55:
+                    line = rand.choice(ccodes)
+                elif kind < 0.7:
+                    line = '@L{0}'.format(rand.randrange(reachable))
+                elif kind < 0.85 and variables:
+                    line = '@v{0}'.format(rand.randrange(variables))
+                else:
+                    line = '@{0}'.format(rand.randrange(32768))
+                if rand.random() < comment_ratio / 2:
+                    line += ' // trailing'
+            destfile.write(line + '\n')
+
+
+def scaling(results):
+    """ Fits time ~ lines^k over benchmark results by least squares.
+
+    Args:
+        results (list of dict): Results with lines and seconds.
+
+    Returns:
+        exponent (float): k, 1.0 for linear scaling, None for too few
+            results.
+
+    """
+    points = [(math.log(result['lines']), math.log(result['seconds']))
+              for result in results if result['seconds'] > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def bench_import(repeat=5):
+    """ Measures import time of assembler with python -X importtime.
+
+        Each repeat imports in a fresh interpreter, so nothing is cached
+        but the compiled bytecode.
+
+    Args:
+        repeat (int): Number of fresh interpreters.
+
+    Returns:
+        best (float): Fastest cumulative import time in seconds.
+        modules (list of tuple): Module name and cumulative import time in
+            seconds of the fastest import, slowest first.
+
+    """
+    scripts = os.path.dirname(os.path.abspath(__file__))
+    best, modules = None, []
+    for _ in range(repeat):
+        stderr = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import assembler'],
+            cwd=scripts, capture_output=True, text=True, check=True).stderr
+        times = []
+        for row in stderr.splitlines()[1:]:  # Skip header
+            _, cumulative, name = row.split('|')
+            times.append((name.strip(), int(cumulative) / 1e6))
+        total = dict(times)['assembler']
+        if best is None or total < best:
+            best, modules = total, sorted(times, key=lambda time: -time[1])
+    return best, modules
+
+
+def bench_startup(asmfile, repeat=5):
+    """ Measures wall time of assembler.py on the commandline.
+
+    Args:
+        asmfile (str): Filepath to input asm, small to measure startup.
+        repeat (int): Number of runs.
+
+    Returns:
+        best (float): Fastest run in seconds.
+
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'assembler.py')
+    with tempfile.TemporaryDirectory() as outputdir:
+        command = [sys.executable, script, asmfile, '-d', outputdir + os.sep,
+                   '--log', os.path.join(outputdir, 'log.txt')]
+        return min(timeit.repeat(
+            lambda: subprocess.run(command, stdout=subprocess.DEVNULL,
+                                   check=True), repeat=repeat, number=1))
+
+
+def environment():
+    """ Returns metadata of the benchmark machine for results. """
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'version': assembler.__version__}
+
+
+def bench_sanitize(asmfiles, repeat=5):
+    """ Measures throughput of the bulk sanitization stage.
+
+        All asm-files are read to a single buffer beforehand, so only
+        assembler._sanitizebuffer is timed.
+
+    Args:
+        asmfiles (list of str): Filepaths to input asm.
+        repeat (int): Number of timing repeats.
+
+    Returns:
+        throughput (float): Sanitized megabytes per second, best of repeats.
+
+    """
+    text = ''
+    for asmfile in asmfiles:
+        with open(asmfile) as srcfile:
+            text += srcfile.read()
+    best = min(timeit.repeat(lambda: assembler._sanitizebuffer(text),
+                             repeat=repeat, number=1))
+    return len(text.encode()) / 2**20 / best
+
+
+if __name__ == "__main__":
+    # Called from commandline with optional asm paths:
+    #    'python benchmark.py "path-to.asm" -r 10'
+    default_asm = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'testfiles', 'asm', 'Pong.asm')
+    parser = argparse.ArgumentParser(description='Benchmark the hack '
+                                     'assembler.')
+    parser.add_argument('filepath', type=str, nargs='*',
+                        default=[default_asm], help='path to source asm')
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help='number of timing repeats')
+    parser.add_argument('--sanitize', action='store_true',
+                        help='also measure sanitization throughput')
+    parser.add_argument('--synthetic', type=int, nargs='*', default=None,
+                        metavar='EXP', help='also benchmark synthetic asm '
+                        'of 10^EXP lines, by default 3 4 5 6')
+    parser.add_argument('--label-density', type=float, default=0.05,
+                        help='share of synthetic lines defining a label')
+    parser.add_argument('--variables', type=int, default=100,
+                        help='number of variables in synthetic asm')
+    parser.add_argument('--comment-ratio', type=float, default=0.2,
+                        help='share of comment lines in synthetic asm')
+    parser.add_argument('--memory', action='store_true',
+                        help='also measure peak memory, in a separate run')
+    parser.add_argument('--importtime', action='store_true',
+                        help='also measure import and startup time')
+    parser.add_argument('--import-budget', type=float, default=25,
+                        metavar='MS', help='exit non-zero when importing '
+                        'assembler takes longer than MS milliseconds')
+    parser.add_argument('--json', type=str, default=None, metavar='OUTFILE',
+                        help='write results as JSON to OUTFILE')
+    parser.add_argument('--history', type=str, default=None,
+                        metavar='HISTFILE', help='record run in JSON history '
+                        'and exit non-zero on regressions against it')
+    parser.add_argument('--report', action='store_true',
+                        help='only list worst regressions of the latest run '
+                        'in --history')
+    parser.add_argument('--window', type=int, default=10,
+                        help='number of earlier runs in rolling baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed slowdown over baseline median')
+    parser.add_argument('--sigma', type=float, default=3.0,
+                        help='allowed standard deviations over baseline mean')
+    args = parser.parse_args()
+
+    def compare(history, record, limit=None):
+        comparisons = history.compare(record, args.window, args.tolerance,
+                                      args.sigma)
+        for comp in comparisons[:limit]:
+            print('{0}: {1:.4g} vs baseline {2:.4g}, {3:+.1%}{4}'.format(
+                comp.case, comp.value, comp.baseline, comp.ratio - 1,
+                ' REGRESSION' if comp.regressed else ''))
+        return sum(comp.regressed for comp in comparisons)
+
+    if args.report:
+        if args.history is None:
+            parser.error('--report requires --history')
+        history = benchhistory(args.history)
+        if not history.runs:
+            sys.exit('No runs in {0}'.format(args.history))
+        latest = history.runs[-1]
+        print('Run {0} at commit {1}:'.format(latest['time'],
+                                              latest['commit']))
+        compare(history, latest, 10)
+        sys.exit(0)
+
+    def run(asmfile, name, repeat):
+        best, lines = bench(asmfile, repeat)
+        result = {'name': name, 'lines': lines, 'seconds': best,
+                  'lines_per_s': lines / best}
+        text = '{0}: {1:.1f} ms, {2:.0f} lines/s'.format(
+            name, best * 1000, lines / best)
+        if args.memory:
+            result['peak_bytes'] = bench_memory(asmfile)
+            text += ', {0:.1f} MB peak, {1:.0f} bytes/line'.format(
+                result['peak_bytes'] / 2**20, result['peak_bytes'] / lines)
+        print(text)
+        return result
+
+    results = [run(asmfile, os.path.basename(asmfile), args.repeat)
+               for asmfile in args.filepath]
+    report = {'environment': environment(), 'results': results}
+
+    if args.synthetic is not None:
+        synthetic = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for exp in args.synthetic or [3, 4, 5, 6]:
+                asmfile = os.path.join(tmpdir, 'synthetic{0}.asm'.format(exp))
+                synthesize(asmfile, 10**exp, args.label_density,
+                           args.variables, args.comment_ratio)
+                # Large inputs take seconds, fewer repeats suffice
+                repeat = args.repeat if exp < 6 else min(args.repeat, 2)
+                synthetic.append(run(asmfile, 'synthetic 10^{0}'.format(exp),
+                                     repeat))
+                os.remove(asmfile)
+        exponent = scaling(synthetic)
+        if exponent is not None:
+            print('scaling: time ~ lines^{0:.2f}'.format(exponent))
+        report['synthetic'] = synthetic
+        report['scaling'] = exponent
+
+    over_budget = False
+    if args.importtime:
+        best, modules = bench_import(args.repeat)
+        print('import assembler: {0:.1f} ms, slowest {1}'.format(
+            best * 1000, ', '.join('{0} {1:.1f} ms'.format(name, time * 1000)
+                                   for name, time in modules[1:4])))
+        startup_asm = os.path.join(os.path.dirname(default_asm), 'Add.asm')
+        startup = bench_startup(startup_asm, args.repeat)
+        print('startup Add.asm: {0:.1f} ms'.format(startup * 1000))
+        results.append({'name': 'import assembler', 'seconds': best})
+        results.append({'name': 'startup Add.asm', 'seconds': startup})
+        over_budget = best * 1000 > args.import_budget
+
+    if args.sanitize:
+        report['sanitize_mb_per_s'] = bench_sanitize(args.filepath,
+                                                     args.repeat)
+        print('sanitize: {0:.1f} MB/s'.format(report['sanitize_mb_per_s']))
+
+    if args.json is not None:
+        with open(args.json, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+    if args.history is not None:
+        history = benchhistory(args.history)
+        record = history.record(report)
+        history.save()
+        regressions = compare(history, record)
+        if regressions:
+            sys.exit('{0} regressions against baseline'.format(regressions))
+
+    if over_budget:
+        sys.exit('Import exceeds budget of {0:.0f} ms'.format(
+            args.import_budget))
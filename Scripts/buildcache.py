@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+class buildcache(object):
+    """ On-disk cache of assembled output keyed by hash of the input.
+
+    Entries are named by a sha256 of the assembler version, output options
+    and asm bytes, so unchanged asm-files are never reassembled. A hit is
+    copied into place, never linked, so later writes to the output can not
+    change the entry, and touched to keep track of recent use. evict
+    removes least recently used entries once the cache exceeds its size
+    limit.
+
+    Attributes:
+        cachedir (str): Directory holding the cache entries.
+        maxsize (int): Size limit of all entries in bytes.
+        version (str): Assembler version, part of every key.
+
+    """
+
+    def __init__(self, cachedir, maxsize=256 * 2**20, version=''):
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+        self.version = version
+        os.makedirs(cachedir, exist_ok=True)
+
+    def key(self, asmfile, *options):
+        """ Hashes asm-file contents with version and output options.
+
+        Args:
+            asmfile (str): Filepath to input asm.
+            options (str): Output options affecting the produced bytes.
+
+        Returns:
+            key (str): Hex digest identifying the cache entry.
+
+        """
+        digest = hashlib.sha256()
+        for part in (self.version, ) + options:
+            digest.update(part.encode() + b'\0')
+        with open(asmfile, 'rb') as srcfile:
+            for block in iter(lambda: srcfile.read(2**20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def fetch(self, key, outfile):
+        """ Places cached output of key at outfile if available.
+
+        Args:
+            key (str): Cache key from key().
+            outfile (str): Filepath to output, replaced on a hit by a copy
+                of the entry, also when it is a link to the entry.
+
+        Returns:
+            hit (bool): True when outfile was served from cache.
+
+        """
+        entry = os.path.join(self.cachedir, key)
+        try:
+            os.utime(entry)  # Mark as recently used
+        except FileNotFoundError:
+            return False
+
+        directory = os.path.dirname(os.path.abspath(outfile))
+        handle, tmpfile = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(handle)
+        try:
+            shutil.copyfile(entry, tmpfile)
+            shutil.copymode(entry, tmpfile)
+            os.replace(tmpfile, outfile)  # Unlinks outfile, never writes it
+        except BaseException:
+            _remove(tmpfile)
+            raise
+        return True
+
+    def store(self, key, outfile):
+        """ Adds freshly assembled outfile to cache under key.
+
+            Entry is written to a temporary file first, so concurrent
+            workers never see a partial entry.
+
+        """
+        handle, tmpfile = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+        os.close(handle)
+        shutil.copyfile(outfile, tmpfile)
+        shutil.copymode(outfile, tmpfile)  # Hits keep permissions of output
+        os.replace(tmpfile, os.path.join(self.cachedir, key))
+
+    def evict(self):
+        """ Removes least recently used entries exceeding the size limit.
+
+        Returns:
+            evicted (int): Number of removed entries.
+
+        """
+        entries = []
+        for entry in os.scandir(self.cachedir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.maxsize:
+                break
+            _remove(path)
+            total -= size
+            evicted += 1
+        return evicted
+
+
+def _remove(path):
+    """ Removes file if it exists. """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
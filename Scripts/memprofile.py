@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+
+import assembler
+from benchmark import synthesize
+
+
+class snapshottimer(assembler.phasetimer):
+    """ Phase timer keeping top allocation sites of the largest phase end.
+
+    After each phase of assembler.main the traced memory still in use is
+    checked, and allocations are snapshotted where it is largest, i.e.
+    where main holds most memory at once. Only the top sites are kept, so
+    the snapshot does not inflate peaks of later phases.
+
+    Attributes:
+        top (int): Number of allocation sites kept.
+        sites (list of tracemalloc.Statistic): Largest allocation sites by
+            line at the largest phase end.
+        largest (int): Traced bytes in use at that point.
+
+    """
+
+    def __init__(self, top=10):
+        super().__init__(memory=True)
+        self.top = top
+        self.sites = []
+        self.largest = -1
+
+    @contextmanager
+    def phase(self, name):
+        with super().phase(name):
+            yield
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.largest:
+            self.largest = current
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__)])
+            self.sites = snapshot.statistics('lineno')[:self.top]
+
+
+def profile(asmfile, top=10):
+    """ Runs assembler.main on asm-file under tracemalloc.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        top (int): Number of allocation sites to return.
+
+    Returns:
+        peak (int): Peak traced bytes of the whole call.
+        instructions (int): Number of assembled instructions.
+        phases (list of tuple): Name, seconds and peak bytes per phase.
+        sites (list of tracemalloc.Statistic): Largest allocation sites by
+            line, at the phase end holding most memory.
+
+    """
+    log = assembler.diagnostics(path=None, echo=False)
+    with tempfile.TemporaryDirectory() as outputdir:
+        timer = snapshottimer(top)
+        try:
+            parsed, _ = assembler.main(asmfile, outputdir + os.sep, log=log,
+                                       timer=timer)
+        finally:
+            timer.stop()
+
+    # Each phase resets the peak, the call peaks in its largest phase
+    peak = max(phase_peak for _, _, phase_peak in timer.phases)
+    return peak, len(parsed), timer.phases, timer.sites
+
+
+if __name__ == "__main__":
+    # Called from commandline with optional asm paths and budget:
+    #    'python memprofile.py "path-to.asm" --synthetic 4 5 --budget 256'
+    default_asm = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'testfiles', 'asm', 'Pong.asm')
+    parser = argparse.ArgumentParser(description='Profile memory use of the '
+                                     'hack assembler.')
+    parser.add_argument('filepath', type=str, nargs='*',
+                        default=[default_asm], help='path to source asm')
+    parser.add_argument('--synthetic', type=int, nargs='*', default=[4, 5],
+                        metavar='EXP', help='also profile synthetic asm of '
+                        '10^EXP lines, by default 4 5')
+    parser.add_argument('--budget', type=float, default=256, metavar='BYTES',
+                        help='fail when peak bytes per instruction exceed '
+                        'BYTES')
+    parser.add_argument('--top', type=int, default=5,
+                        help='number of allocation sites listed per case')
+    args = parser.parse_args()
+
+    def run(asmfile, name):
+        peak, instructions, phases, sites = profile(asmfile, args.top)
+        per_instruction = peak / max(instructions, 1)
+        print('{0}: {1:.2f} MB peak, {2:.0f} bytes/instruction{3}'.format(
+            name, peak / 2**20, per_instruction,
+            ' OVER BUDGET' if per_instruction > args.budget else ''))
+        print('  ' + ', '.join(
+            '{0} {1:.2f} MB'.format(phase, phase_peak / 2**20)
+            for phase, _, phase_peak in phases))
+        for site in sites:
+            frame = site.traceback[0]
+            print('  {0:>9.1f} KB {1}:{2}'.format(
+                site.size / 2**10, os.path.basename(frame.filename),
+                frame.lineno))
+        return per_instruction <= args.budget
+
+    within = [run(asmfile, os.path.basename(asmfile))
+              for asmfile in args.filepath]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for exp in args.synthetic:
+            asmfile = os.path.join(tmpdir, 'synthetic{0}.asm'.format(exp))
+            synthesize(asmfile, 10**exp)
+            within.append(run(asmfile, 'synthetic 10^{0}'.format(exp)))
+            os.remove(asmfile)
+
+    if not all(within):
+        sys.exit('{0} cases over budget of {1:.0f} bytes/instruction'.format(
+            within.count(False), args.budget))
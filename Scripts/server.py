@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import assembler
+
+# Context of a worker process, keeps its encoding cache warm between batches
+_context = None
+
+
+class assemblyserver(object):
+    """ Long-running local assembly service with warm worker processes.
+
+    Connections are handled by asyncio, encoding runs in a process pool
+    whose workers keep the assembler imported and its tables and encoding
+    cache warm between jobs. Requests and responses are JSON lines, e.g.
+
+        {"jobs": [{"name": "Add.asm", "source": "@2\\nD=A\\n..."}]}
+        {"results": [{"name": "Add.asm", "words": [2, 60432, ...],
+                      "errors": [{"line_loc": 4, "line": "...", ...}]}]}
+
+    Jobs of all connections are queued and handed to the workers in
+    batches, so thousands of tiny assemblies cost one process round trip
+    per batch instead of an interpreter start each. A batch is whatever is
+    queued once a worker is free, up to maxbatch jobs, so an idle server
+    adds no waiting.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        maxbatch (int): Largest number of jobs handed to a worker at once.
+        maxrequest (int): Size limit of a single request line in bytes.
+        served (int): Number of jobs assembled.
+
+    """
+
+    def __init__(self, jobs=0, maxbatch=256, maxrequest=64 * 2**20):
+        self.workers = jobs or os.cpu_count()
+        self.maxbatch = maxbatch
+        self.maxrequest = maxrequest
+        self.served = 0
+        self._pool = None
+        self._queue = None
+        self._running = set()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        """ Serves assembly requests until cancelled.
+
+        Args:
+            host (str): Address to listen on, localhost by default.
+            port (int): TCP port to listen on.
+            path (str): Optional Unix socket path, used instead of TCP.
+
+        """
+        self._queue = asyncio.Queue()
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 initializer=_warmworker) as self._pool:
+            dispatcher = asyncio.ensure_future(self._dispatch())
+            if path is not None:
+                server = await asyncio.start_unix_server(
+                    self._handle, path, limit=self.maxrequest)
+            else:
+                server = await asyncio.start_server(
+                    self._handle, host, port, limit=self.maxrequest)
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                dispatcher.cancel()
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+
+    async def assemble(self, name, source):
+        """ Queues a single job and waits for its result.
+
+        Args:
+            name (str): Name of the job, returned with the result.
+            source (str): asm text with lines separated by newlines.
+
+        Returns:
+            result (dict): name, instruction words and parse errors.
+
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((name, source), future))
+        return await future
+
+    async def _handle(self, reader, writer):
+        """ Answers JSON line requests of a single connection. """
+        try:
+            async for line in reader:
+                try:
+                    jobs = json.loads(line)['jobs']
+                    for job in jobs:
+                        if not isinstance(job.get('source'), str):
+                            raise TypeError('Job source must be asm text')
+                    results = await asyncio.gather(*(
+                        self.assemble(job.get('name'), job['source'])
+                        for job in jobs))
+                    response = {'results': results}
+                except (ValueError, KeyError, TypeError,
+                        AttributeError) as err:
+                    response = {'error': str(err)}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ValueError:  # Request line over limit, can not resync
+            error = 'Request exceeds {0} bytes'.format(self.maxrequest)
+            writer.write(json.dumps({'error': error}).encode() + b'\n')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self):
+        """ Hands queued jobs to free workers in batches. """
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            batch = [await self._queue.get()]
+            while len(batch) < self.maxbatch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            task = asyncio.ensure_future(self._run(batch, slots))
+            self._running.add(task)  # Keep a reference until done
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch, slots):
+        """ Assembles a batch in a worker and resolves its futures. """
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._pool, _assemblebatch, [job for job, _ in batch])
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+        else:
+            self.served += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            slots.release()
+
+
+def _warmworker():
+    """ Creates the context of a fresh worker and warms it up.
+
+        Every worker is a separate process, so its context is shared by
+        nothing but the successive batches of that worker.
+
+    """
+    global _context
+    _context = assembler.assemblercontext()
+    _context.assemble_lines(['@0', 'D=A'])
+
+
+def _assemblebatch(jobs):
+    """ Assembles a batch of jobs, run in a worker process.
+
+    Args:
+        jobs (list of tuple): Name and asm text per job.
+
+    Returns:
+        results (list of dict): name, instruction words and parse errors per
+            job, in input order.
+
+    """
+    results = []
+    for name, source in jobs:
+        _context.log = assembler.diagnostics(path=None, echo=False)
+        words = _context.assemble_lines([source])
+        results.append({'name': name, 'words': words.tolist(), 'errors': [
+            {'line_loc': err.line_loc, 'line': err.line, 'type': err.type}
+            for _, err in _context.log.errors]})
+    return results
+
+
+def submit(sources, host='127.0.0.1', port=8765, path=None):
+    """ Sends asm sources to a running server as a single request.
+
+    Args:
+        sources (dict of str: str): asm text per job name.
+        host (str): Address of the server.
+        port (int): TCP port of the server.
+        path (str): Optional Unix socket path, used instead of TCP.
+
+    Returns:
+        results (list of dict): name, instruction words and parse errors per
+            job, in input order.
+
+    Raises:
+        RuntimeError when the server rejects the request.
+
+    """
+    if path is not None:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(path)
+    else:
+        conn = socket.create_connection((host, port))
+    request = {'jobs': [{'name': name, 'source': source}
+                        for name, source in sources.items()]}
+    with conn, conn.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode() + b'\n')
+        stream.flush()
+        response = json.loads(stream.readline())
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response['results']
+
+
+if __name__ == "__main__":
+    # Called from commandline to start the service:
+    #    'python server.py --port 8765 -j 0'
+    # or with asm paths to assemble them on a running service:
+    #    'python server.py "asm-dir" -d "out" --port 8765'
+    parser = argparse.ArgumentParser(description='Local hack assembly '
+                                     'service and client.')
+    parser.add_argument('filepath', type=str, nargs='*',
+                        help='asm to assemble on a running service, '
+                        'starts the service when empty')
+    parser.add_argument('--destination', '-d', type=str, default=None,
+                        metavar='OUTPUTDIR',
+                        help='output directory, by default uses asm path')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='address to listen on or connect to')
+    parser.add_argument('--port', '-p', type=int, default=8765,
+                        help='TCP port to listen on or connect to')
+    parser.add_argument('--socket', type=str, default=None, metavar='PATH',
+                        help='Unix socket path, used instead of TCP')
+    parser.add_argument('--jobs', '-j', type=int, default=0,
+                        help='number of worker processes, 0 uses all cores')
+    parser.add_argument('--max-batch', type=int, default=256, metavar='N',
+                        help='largest number of jobs per worker round trip')
+    args = parser.parse_args()
+
+    if not args.filepath:
+        service = assemblyserver(args.jobs, args.max_batch)
+        try:
+            asyncio.run(service.serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            print('Served {0} jobs'.format(service.served))
+    else:
+        outputdir = args.destination
+        if outputdir is not None and outputdir[-1] not in '\\/':
+            outputdir += os.sep
+        sources = {}
+        for asmfile in assembler._collectasm(args.filepath):
+            with open(asmfile) as srcfile:
+                sources[asmfile] = srcfile.read()
+        failed = 0
+        for result in submit(sources, args.host, args.port, args.socket):
+            for err in result['errors']:
+                print('{0}: {1} Error parsing {2}: {3}'.format(
+                    result['name'], err['type'], err['line_loc'],
+                    err['line']))
+            failed += len(result['errors'])
+            assembler.write(array('H', result['words']),
+                            assembler._outpath(result['name'], outputdir))
+        print('Assembled {0} files, {1} parse errors'.format(len(sources),
+                                                             failed))
@@ -1,6 +1,6 @@
 cd /d %~dp0
 
-PowerShell.exe -Command "& Get-ChildItem .\asm -Filter *.asm | Foreach-Object {	python ..\assembler.py $_.FullName -d .\prospective\}"
+python ..\assembler.py .\asm -d .\prospective\ --jobs 0
 
 :: Using rdiff (in path) by https://gist.github.com/cchamberlain/883959151aa1162e73f1
 PowerShell.exe -Command "& rdiff .\preassembled, .\prospective"
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import io
+import os
+import sys
+import tempfile
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import assembler  # noqa: E402
+
+# Assembly modes writing output files, compared in both output formats
+_FILE_MODES = ('main', 'stream', 'mmap', 'chunked')
+
+
+def synthesize(tmpdir):
+    """ Writes asm cases outside the test corpus to tmpdir.
+
+        Cases cover label and variable addresses past 15 and 16 bits,
+        referenced before and after their definition, and malformed lines
+        and invalid symbols. Labels are unique, as all modes require.
+
+    Returns:
+        asmfiles (list of str): Filepaths of the written cases.
+
+    """
+    cases = {
+        'invalid': ['@foo-bar', '@1bad', '(bad-label)', '@0x10', '@32768',
+                    '@', '@-1', 'Memory=Address', 'M=D;JMPx', 'D=M;',
+                    '@LATER', '@bad-later', '(LATER)', '@LATER', '@var',
+                    'M=1', '@var', '@32767', 'D;JGT  // comment'],
+        'labels': ['@FAR', '@FARTHER', '@NEAR', '0;JMP', '(NEAR)'] +
+                  ['@NEAR', 'D=A'] * 16400 + ['(FAR)', '@FAR', '@x'] +
+                  ['@FAR', 'D=A'] * 16400 + ['(FARTHER)', '@FARTHER', '@y',
+                                             'M=1', '@FAR'],
+        'variables': ['@v{0}'.format(i) for i in range(32760)] +
+                     ['@v0', '@v32759', '@END', '0;JMP', '(END)'],
+    }
+    asmfiles = []
+    for name, lines in cases.items():
+        asmfile = os.path.join(tmpdir, name + '.asm')
+        with open(asmfile, 'w') as srcfile:
+            srcfile.write('\n'.join(lines) + '\n')
+        asmfiles.append(asmfile)
+    return asmfiles
+
+
+def assemble(asmfile, mode, fmt='bin', tmpdir=None):
+    """ Assembles asm-file in given mode, collecting errors silently.
+
+    Args:
+        asmfile (str): Filepath to input asm.
+        mode (str): main, stream, mmap, chunked, pipe, lines, bytes, session
+            or edits, a session built by inserting and deleting lines.
+        fmt (str): Output format of file writing modes and pipe.
+        tmpdir (str): Directory for output of file writing modes.
+
+    Returns:
+        words (list of int): Instruction words in output.
+        errors (list of tuple): Sorted line_loc, line and type of errors.
+
+    """
+    log = assembler.diagnostics(path=None, echo=False)
+    errors = None
+    if mode in _FILE_MODES:
+        outputdir = tmpdir + os.sep
+        if mode == 'stream':
+            assembler.stream(asmfile, outputdir, fmt, log=log)
+        elif mode == 'mmap':
+            assembler.mapped(asmfile, outputdir, fmt, log=log)
+        elif mode == 'chunked':
+            assembler.parallel(asmfile, outputdir, 2, fmt, chunks=5, log=log)
+        else:
+            assembler.main(asmfile, outputdir, fmt, log=log)
+        with open(assembler._outpath(asmfile, outputdir, fmt), 'rb') as out:
+            output = out.read()
+    elif mode == 'pipe':
+        destfile = io.BytesIO()
+        with open(asmfile) as srcfile:
+            assembler.pipe(srcfile, destfile, fmt, log=log)
+        output = destfile.getvalue()
+    else:
+        with open(asmfile) as srcfile:
+            lines = srcfile.readlines()
+        if mode == 'lines':
+            words = assembler.assemble_lines(lines, log)[0]
+        elif mode == 'bytes':
+            words = assembler.assemble_bytes(''.join(lines).encode(), log)[0]
+        else:
+            if mode == 'session':
+                session = assembler.assemblysession(lines)
+            else:  # Edits shift instructions and errors of later lines
+                half = len(lines) // 2
+                session = assembler.assemblysession(lines[half:])
+                session.update(0, 0, ['bad', '@1'] + lines[:half])
+                index = len(lines) // 4 + 2  # Source line of lines[index - 2]
+                session.edit(index, 'Memory=Address')
+                session.edit(index, lines[index - 2])
+                session.update(0, 2, [])
+            words = [word for word in session.words if word is not None]
+            errors = list(session.errors.values())
+        output = None
+
+    if output is not None:
+        if fmt == 'bin':
+            words = array('H')
+            words.frombytes(output)
+            if sys.byteorder != 'little':
+                words.byteswap()
+        else:
+            words = [int(line, 2) for line in output.split()]
+    if errors is None:
+        errors = [err for _, err in log.errors]
+    return list(words), sorted((err.line_loc, err.line, err.type)
+                               for err in errors)
+
+
+def compare(asmfile):
+    """ Compares output and errors of every mode with main.
+
+    Returns:
+        differing (list of str): Modes and formats differing from main,
+            including modes raising an exception.
+
+    """
+    differing = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        expected = assemble(asmfile, 'main', 'bin', tmpdir)
+        for mode in _FILE_MODES + ('pipe', 'lines', 'bytes', 'session',
+                                   'edits'):
+            fmts = ('hack', 'bin') if mode in _FILE_MODES + ('pipe', ) \
+                else ('bin', )
+            for fmt in fmts:
+                try:
+                    same = assemble(asmfile, mode, fmt, tmpdir) == expected
+                except Exception as err:
+                    same = False
+                    raised = ' ({0!r})'.format(err)
+                else:
+                    raised = ''
+                if not same:
+                    differing.append('{0} {1}{2}'.format(mode, fmt,
+                                                         raised))
+    return differing
+
+
+if __name__ == "__main__":
+    # Called from commandline with optional asm paths:
+    #    'python equivalence.py ["path-to.asm" ...]'
+    parser = argparse.ArgumentParser(description='Check that all assembly '
+                                     'modes match main on the test corpus '
+                                     'and synthetic edge cases.')
+    parser.add_argument('filepath', type=str, nargs='*',
+                        help='path to source asm, by default asm\\*.asm')
+    args = parser.parse_args()
+
+    asmfiles = args.filepath or sorted(glob.glob(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'asm', '*.asm')))
+    failed = 0
+    with tempfile.TemporaryDirectory() as casedir:
+        asmfiles += synthesize(casedir)
+        for asmfile in asmfiles:
+            differing = compare(asmfile)
+            print('{0}: {1}'.format(os.path.basename(asmfile),
+                                    'differs in ' + ', '.join(differing)
+                                    if differing else 'ok'))
+            failed += bool(differing)
+
+    if failed:
+        sys.exit('{0} of {1} asm-files differ between modes'.format(
+            failed, len(asmfiles)))